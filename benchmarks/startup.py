@@ -0,0 +1,125 @@
+"""
+Measure import time of PyNiChon's entry modules.
+
+Each module is imported in a fresh interpreter with -X importtime, and the
+cumulative import time of the module and of the slowest modules it pulls in are
+recorded. Results can be written as JSON and compared against an earlier run:
+
+    python benchmarks/startup.py --output startup.json
+    python benchmarks/startup.py --compare startup.json
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+MODULES = [
+    "pynichon.io.io_manager",
+    "pynichon.utils.spell_manager",
+    "pynichon.cli",
+    "pynichon.gui.main_window",
+]
+
+# Modules that should only be imported once a NIF is actually loaded or saved.
+DEFERRED_MODULES = ["nifgen", "pyffi"]
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure_imports(module, repeat):
+    """Return the best cumulative import time per module (in ms) over several runs."""
+    best = {}
+    for _ in range(repeat):
+        process = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=REPO_DIR, capture_output=True, text=True)
+        if process.returncode != 0:
+            error = [line for line in process.stderr.splitlines() if not line.startswith("import time:")]
+            raise RuntimeError(f"Importing {module} failed: {error[-1] if error else process.returncode}")
+
+        for line in process.stderr.splitlines():
+            if not line.startswith("import time:") or "|" not in line:
+                continue
+            fields = line[len("import time:"):].split("|")
+            try:
+                cumulative = int(fields[1]) / 1000
+            except ValueError:
+                # Column header line.
+                continue
+            name = fields[2].strip()
+            best[name] = min(best.get(name, cumulative), cumulative)
+    return best
+
+
+def run(repeat, top):
+    results = {}
+    for module in MODULES:
+        try:
+            timings = measure_imports(module, repeat)
+        except RuntimeError as e:
+            print(e, file=sys.stderr)
+            continue
+        slowest = sorted(
+            ((name, ms) for name, ms in timings.items() if name != module),
+            key=lambda item: item[1], reverse=True)[:top]
+        results[module] = {
+            "total_ms": timings.get(module, 0.0),
+            "deferred_imported": [
+                name for name in DEFERRED_MODULES if name in timings],
+            "slowest": dict(slowest),
+        }
+    return results
+
+
+def print_results(results, baseline=None, threshold=0.2):
+    regressions = []
+    for module, result in results.items():
+        line = f"{module}: {result['total_ms']:.1f} ms"
+        if baseline and module in baseline:
+            previous = baseline[module]["total_ms"]
+            if previous > 0:
+                change = (result["total_ms"] - previous) / previous
+                line += f" ({change:+.0%} vs {previous:.1f} ms)"
+                if change > threshold:
+                    regressions.append(module)
+        print(line)
+        if result["deferred_imported"]:
+            print(f"  imports {', '.join(result['deferred_imported'])} eagerly")
+            regressions.append(module)
+        for name, ms in result["slowest"].items():
+            print(f"  {name}: {ms:.1f} ms")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="runs per module; the fastest is kept")
+    parser.add_argument("--top", type=int, default=10, help="number of slowest imports to list")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare with")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="relative slowdown reported as a regression")
+    args = parser.parse_args(argv)
+
+    results = run(args.repeat, args.top)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)
+    regressions = print_results(results, baseline, args.threshold)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if regressions:
+        print(f"Regressions: {', '.join(sorted(set(regressions)))}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,217 @@
+"""
+Generate synthetic NIF corpora for benchmarks.
+
+Files are written byte by byte from a small subset of the format (NiNode scene
+graphs with NiBinaryExtraData payloads), so no NIF library is needed to create
+them. Several game versions are covered, and the corpus can also be packed into
+a BSA or BA2 archive:
+
+    python benchmarks/synthetic.py corpus --count 50
+    python benchmarks/synthetic.py corpus --count 50 --archive corpus.bsa
+"""
+
+import argparse
+import os
+import random
+import struct
+import sys
+
+# name: (version string, user version, BS version)
+PROFILES = {
+    "oblivion": ("20.0.0.5", 11, 11),
+    "fallout3": ("20.2.0.7", 11, 34),
+    "skyrim": ("20.2.0.7", 12, 83),
+}
+
+KINDS = ["small", "large", "many_blocks", "deep"]
+
+
+def _version_int(version_string):
+    a, b, c, d = (int(part) for part in version_string.split("."))
+    return (a << 24) | (b << 16) | (c << 8) | d
+
+
+def _sized_string(text):
+    data = text.encode("latin-1")
+    return struct.pack("<I", len(data)) + data
+
+
+def _export_string(text):
+    data = text.encode("latin-1") + b"\x00"
+    return struct.pack("<B", len(data)) + data
+
+
+def _refs(refs):
+    return struct.pack(f"<I{len(refs)}i", len(refs), *refs)
+
+
+class SyntheticNif:
+    """
+    A scene graph of NiNode and NiBinaryExtraData blocks that can be serialized for
+    one of the PROFILES.
+    """
+
+    def __init__(self, profile):
+        self.version_string, self.user_version, self.bs_version = PROFILES[profile]
+        self.version = _version_int(self.version_string)
+        self.blocks = []
+
+    def add_node(self, name, parent=None):
+        self.blocks.append({"type": "NiNode", "name": name, "children": [], "extra_data": []})
+        index = len(self.blocks) - 1
+        if parent is not None:
+            self.blocks[parent]["children"].append(index)
+        return index
+
+    def add_extra_data(self, name, size, parent):
+        payload = random.Random(size).randbytes(size) if size else b""
+        self.blocks.append({"type": "NiBinaryExtraData", "name": name, "data": payload})
+        index = len(self.blocks) - 1
+        self.blocks[parent]["extra_data"].append(index)
+        return index
+
+    def _string(self, text, strings):
+        if self.version >= 0x14010001:
+            if text not in strings:
+                strings.append(text)
+            return struct.pack("<i", strings.index(text))
+        return _sized_string(text)
+
+    def _block_data(self, block, strings):
+        data = self._string(block["name"], strings)
+        if block["type"] == "NiBinaryExtraData":
+            return data + struct.pack("<I", len(block["data"])) + block["data"]
+
+        # NiObjectNET
+        data += _refs(block["extra_data"]) + struct.pack("<i", -1)
+        # NiAVObject: flags, translation, rotation, scale
+        data += struct.pack("<I" if self.bs_version > 26 else "<H", 14)
+        data += struct.pack("<3f", 0.0, 0.0, 0.0)
+        data += struct.pack("<9f", 1.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 1.0)
+        data += struct.pack("<f", 1.0)
+        if self.bs_version <= 34:
+            data += _refs([])  # properties
+        data += struct.pack("<i", -1)  # collision object
+        # NiNode
+        data += _refs(block["children"])
+        if self.bs_version < 130:
+            data += _refs([])  # effects
+        return data
+
+    def to_bytes(self):
+        strings = []
+        block_data = [self._block_data(block, strings) for block in self.blocks]
+        block_types = []
+        for block in self.blocks:
+            if block["type"] not in block_types:
+                block_types.append(block["type"])
+
+        header = f"Gamebryo File Format, Version {self.version_string}\n".encode("ascii")
+        header += struct.pack("<IBII", self.version, 1, self.user_version, len(self.blocks))
+        header += struct.pack("<I", self.bs_version)
+        header += _export_string("pynichon") + _export_string("") + _export_string("")
+        header += struct.pack("<H", len(block_types)) + b"".join(_sized_string(t) for t in block_types)
+        header += struct.pack(f"<{len(self.blocks)}H", *(block_types.index(b["type"]) for b in self.blocks))
+        if self.version >= 0x14020005:
+            header += struct.pack(f"<{len(block_data)}I", *(len(data) for data in block_data))
+        if self.version >= 0x14010001:
+            header += struct.pack("<II", len(strings), max((len(s) for s in strings), default=0))
+            header += b"".join(_sized_string(s) for s in strings)
+        header += struct.pack("<I", 0)  # groups
+
+        footer = _refs([0])  # roots
+        return header + b"".join(block_data) + footer
+
+
+def make_nif(kind, profile, seed=0):
+    """Build a synthetic NIF of the given kind (see KINDS)."""
+    rng = random.Random(seed)
+    nif = SyntheticNif(profile)
+    root = nif.add_node("Scene Root")
+
+    if kind == "small":
+        for i in range(3):
+            nif.add_node(f"Node {i}", root)
+        nif.add_extra_data("Data", rng.randint(64, 512), root)
+    elif kind == "large":
+        for i in range(4):
+            node = nif.add_node(f"Node {i}", root)
+            nif.add_extra_data(f"Data {i}", rng.randint(1, 2) << 20, node)
+    elif kind == "many_blocks":
+        parents = [root]
+        for i in range(rng.randint(2000, 3000)):
+            parent = rng.choice(parents)
+            if i % 5 == 0:
+                nif.add_extra_data(f"Data {i}", rng.randint(16, 256), parent)
+            else:
+                parents.append(nif.add_node(f"Node {i}", parent))
+    elif kind == "deep":
+        parent = root
+        for i in range(rng.randint(400, 600)):
+            parent = nif.add_node(f"Node {i}", parent)
+        nif.add_extra_data("Leaf Data", 256, parent)
+    else:
+        raise ValueError(f"Unknown corpus kind {kind}.")
+    return nif.to_bytes()
+
+
+def generate_corpus(output_dir, count, kinds=KINDS, profiles=PROFILES):
+    """
+    Write count files of every kind, spread across the profiles, to output_dir/<kind>.
+
+    Returns a dict of kind to list of file paths.
+    """
+    corpus = {}
+    for kind in kinds:
+        kind_dir = os.path.join(output_dir, kind)
+        os.makedirs(kind_dir, exist_ok=True)
+        corpus[kind] = []
+        for i in range(count):
+            profile = list(profiles)[i % len(profiles)]
+            file_path = os.path.join(kind_dir, f"{kind}_{profile}_{i:04d}.nif")
+            with open(file_path, "wb") as f:
+                f.write(make_nif(kind, profile, seed=i))
+            corpus[kind].append(file_path)
+    return corpus
+
+
+def write_archive(corpus_dir, archive_path, compressed=False):
+    """Pack every file below corpus_dir into a BSA or BA2 archive, in its meshes folder."""
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from pynichon.io.archive import BSA_COMPRESSED, BSA_DIRECTORY_NAMES, BSA_FILE_NAMES, Ba2Writer, BsaWriter
+
+    if archive_path.lower().endswith(".ba2"):
+        writer = Ba2Writer(compressed=compressed)
+    else:
+        flags = BSA_DIRECTORY_NAMES | BSA_FILE_NAMES | (BSA_COMPRESSED if compressed else 0)
+        writer = BsaWriter(104, flags)
+    for root, _, files in os.walk(corpus_dir):
+        for file in files:
+            file_path = os.path.join(root, file)
+            with open(file_path, "rb") as f:
+                writer.add(os.path.join("meshes", os.path.relpath(file_path, corpus_dir)), f.read())
+    writer.write(archive_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic NIF corpora.")
+    parser.add_argument("output_dir")
+    parser.add_argument("--count", type=int, default=20, help="files per corpus kind")
+    parser.add_argument("--kind", action="append", choices=KINDS, help="corpus kinds (default: all)")
+    parser.add_argument("--profile", action="append", choices=list(PROFILES), help="versions (default: all)")
+    parser.add_argument("--archive", metavar="PATH", help="also pack the corpus into a .bsa or .ba2 archive")
+    parser.add_argument("--compress", action="store_true", help="compress the files in the archive")
+    args = parser.parse_args(argv)
+
+    corpus = generate_corpus(args.output_dir, args.count, args.kind or KINDS, args.profile or list(PROFILES))
+    for kind, file_paths in corpus.items():
+        size = sum(os.path.getsize(file_path) for file_path in file_paths)
+        print(f"{kind}: {len(file_paths)} files, {size / (1 << 20):.1f} MiB")
+    if args.archive:
+        write_archive(args.output_dir, args.archive, args.compress)
+        print(f"{args.archive}: {os.path.getsize(args.archive) / (1 << 20):.1f} MiB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
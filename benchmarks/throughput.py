@@ -0,0 +1,212 @@
+"""
+Benchmark NifFile.load_nif, spell execution and NifFile.save_nif throughput.
+
+Runs every corpus kind serially and on a process pool, and reports per-stage
+latency percentiles, files per second and peak RSS. Results are written as JSON
+and can be compared with an earlier run:
+
+    python benchmarks/throughput.py --generate 20 --output before.json
+    python benchmarks/throughput.py --generate 20 --compare before.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows; peak RSS is reported as null there.
+    resource = None
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pynichon.io.nif_io import NifFile, get_nif_format  # noqa: E402
+
+STAGES = ["load", "spell", "save"]
+
+_spell_function = None
+_output_dir = None
+
+
+def _init_worker(spell, output_dir):
+    global _spell_function, _output_dir
+    if spell:
+        from pynichon.utils.spell_manager import get_spell_manager
+        resolved_spell = get_spell_manager().resolve(spell)
+        resolved_spell.load()
+        _spell_function = resolved_spell.bind(resolved_spell.options_model().snapshot())
+    else:
+        _spell_function = lambda nif_data: None
+    _output_dir = output_dir
+    get_nif_format()
+
+
+def _bench_file(file_path):
+    """Load, run the spell on and save one file, returning the time of each stage."""
+    output_path = os.path.join(_output_dir, str(os.getpid()), os.path.basename(file_path))
+
+    start = time.perf_counter()
+    nif_data = NifFile.load_nif(file_path)
+    loaded = time.perf_counter()
+    _spell_function(nif_data)
+    spelled = time.perf_counter()
+    NifFile.save_nif(nif_data, output_path)
+    saved = time.perf_counter()
+
+    return {"load": loaded - start, "spell": spelled - loaded, "save": saved - spelled}
+
+
+def peak_rss_mb(children=False):
+    """
+    Return the peak RSS of this process, or of the largest worker process so far.
+
+    The operating system only tracks the high-water mark, so later runs in the same
+    invocation report at least the peak of earlier ones.
+    """
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere.
+    scale = 1 if sys.platform == "darwin" else 1024
+    return usage.ru_maxrss * scale / (1 << 20)
+
+
+def percentiles(values):
+    values = sorted(values)
+    if not values:
+        return {}
+
+    def at(fraction):
+        return values[min(int(fraction * len(values)), len(values) - 1)] * 1000
+
+    return {
+        "mean_ms": statistics.fmean(values) * 1000,
+        "p50_ms": at(0.50),
+        "p90_ms": at(0.90),
+        "p99_ms": at(0.99),
+        "max_ms": values[-1] * 1000,
+    }
+
+
+def run_benchmark(kind, file_paths, workers, spell, output_dir):
+    """Benchmark one corpus kind, in-process if workers is 1, else on a process pool."""
+    start = time.perf_counter()
+    if workers == 1:
+        _init_worker(spell, output_dir)
+        timings = [_bench_file(file_path) for file_path in file_paths]
+        rss = peak_rss_mb()
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(spell, output_dir)) as executor:
+            timings = list(executor.map(_bench_file, file_paths))
+        rss = peak_rss_mb(children=True)
+    seconds = time.perf_counter() - start
+
+    return {
+        "corpus": kind,
+        "mode": "serial" if workers == 1 else "parallel",
+        "workers": workers,
+        "files": len(file_paths),
+        "bytes": sum(os.path.getsize(file_path) for file_path in file_paths),
+        "seconds": seconds,
+        "files_per_sec": len(file_paths) / seconds if seconds > 0 else 0.0,
+        "peak_rss_mb": rss,
+        "stages": {stage: percentiles([t[stage] for t in timings]) for stage in STAGES},
+    }
+
+
+def load_corpus(corpus_dir):
+    corpus = {}
+    for kind in sorted(os.listdir(corpus_dir)):
+        kind_dir = os.path.join(corpus_dir, kind)
+        if os.path.isdir(kind_dir):
+            file_paths = sorted(
+                os.path.join(kind_dir, name) for name in os.listdir(kind_dir) if name.endswith(".nif"))
+            if file_paths:
+                corpus[kind] = file_paths
+    return corpus
+
+
+def run_key(run):
+    return f"{run['corpus']}/{run['mode']}/{run['workers']}"
+
+
+def print_run(run, baseline_runs):
+    line = (f"{run_key(run):<28} {run['files_per_sec']:8.1f} files/s"
+            f"  peak RSS {run['peak_rss_mb'] or 0:7.1f} MiB")
+    previous = baseline_runs.get(run_key(run))
+    if previous and previous["files_per_sec"] > 0:
+        change = run["files_per_sec"] / previous["files_per_sec"] - 1
+        line += f"  ({change:+.0%} files/s)"
+    print(line)
+    for stage in STAGES:
+        stats = run["stages"][stage]
+        print(f"    {stage:<6} p50 {stats['p50_ms']:8.2f} ms  p90 {stats['p90_ms']:8.2f} ms"
+              f"  p99 {stats['p99_ms']:8.2f} ms  max {stats['max_ms']:8.2f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--corpus", help="directory with one subdirectory of NIFs per corpus kind")
+    source.add_argument("--generate", type=int, metavar="COUNT",
+                        help="generate a synthetic corpus with COUNT files per kind")
+    parser.add_argument("--spell", action="append", help="spell to run (default: none)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="worker processes for the parallel runs")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare with")
+    args = parser.parse_args(argv)
+
+    work_dir = tempfile.mkdtemp(prefix="pynichon_bench_")
+    try:
+        if args.generate:
+            from synthetic import generate_corpus
+            corpus = generate_corpus(os.path.join(work_dir, "corpus"), args.generate)
+        else:
+            corpus = load_corpus(args.corpus)
+
+        spell = None
+        if args.spell:
+            spell = args.spell[0] if len(args.spell) == 1 else args.spell
+
+        baseline_runs = {}
+        if args.compare:
+            with open(args.compare, "r") as f:
+                baseline_runs = {run_key(run): run for run in json.load(f)["runs"]}
+
+        runs = []
+        for kind, file_paths in corpus.items():
+            for workers in sorted({1, max(args.workers, 1)}):
+                run = run_benchmark(kind, file_paths, workers, spell, os.path.join(work_dir, "output"))
+                runs.append(run)
+                print_run(run, baseline_runs)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.output:
+        results = {
+            "meta": {
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "spell": spell,
+            },
+            "runs": runs,
+        }
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,233 @@
+"""Command line interface for running spells without the GUI."""
+
+import argparse
+import logging
+import os
+import re
+import sys
+import time
+from collections import Counter
+
+from pynichon.io.batch import FAILED, LARGE_FILE_SIZE, memory_limits_supported
+from pynichon.io.io_manager import get_io_manager
+from pynichon.io.report import AnalysisReport, CsvReport, JsonLinesReport
+from pynichon.utils.instrumentation import CsvSummarySink, Instrumentation, JsonLinesSink, SlowestProfilesSink
+from pynichon.utils.spell_manager import get_spell_manager
+
+EXIT_OK = 0
+EXIT_FILE_ERRORS = 1
+EXIT_USAGE = 2
+EXIT_INTERRUPTED = 130
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m pynichon",
+        description="Apply spells to NIF files.")
+    parser.add_argument("inputs", nargs="*", help="input files, directories or BSA/BA2 archives")
+    parser.add_argument("-s", "--spell", action="append", dest="spells", default=[],
+                        help="spell to apply; repeat to run several spells in one pass")
+    parser.add_argument("-o", "--output-dir", default="",
+                        help="output directory (files are modified in place if omitted)")
+    parser.add_argument("-r", "--include-subdirs", action="store_true", help="process subdirectories")
+    parser.add_argument("--filter", metavar="REGEX", help="only process files whose path matches")
+    parser.add_argument("--rename", metavar="REGEX", help="remove matches from output file names")
+    parser.add_argument("--skip-errors", action="store_true", help="continue after files that fail")
+    parser.add_argument("--only-modified", action="store_true", help="only write files the spell changed")
+    parser.add_argument("--incremental", action="store_true",
+                        help="skip files already processed with the same spell and options")
+    parser.add_argument("--pack", action="store_true",
+                        help="write meshes from archives into copies of the archives instead of loose files")
+    parser.add_argument("--dedup", choices=["link", "copy"],
+                        help="process identical input files once and hard-link or copy the output to the others")
+    parser.add_argument("--header-index", metavar="PATH", default="",
+                        help="file to cache NIF headers in between runs")
+    parser.add_argument("-O", "--option", action="append", dest="options", default=[], metavar="NAME=VALUE",
+                        help="spell option value; repeat for several options")
+    parser.add_argument("-j", "--workers", type=int, default=1,
+                        help="number of worker processes (0 for one per CPU)")
+    parser.add_argument("--large-file-size", type=int, metavar="MIB",
+                        help="process files at least this large one at a time in a separate worker "
+                             f"(default {LARGE_FILE_SIZE >> 20})")
+    parser.add_argument("--memory-limit", type=int, metavar="MIB",
+                        help="cap the memory of each worker process except the large-file one (POSIX only)")
+    parser.add_argument("--write-back", action="store_true",
+                        help="write output files on a background thread (single worker only)")
+    parser.add_argument("--analyze", action="store_true",
+                        help="run the spell read-only and report its findings instead of writing files")
+    parser.add_argument("--report-jsonl", metavar="PATH", help="write findings as JSON lines (implies --analyze)")
+    parser.add_argument("--report-csv", metavar="PATH", help="write findings as CSV (implies --analyze)")
+    parser.add_argument("--stats-jsonl", metavar="PATH", help="write per-file stage timings as JSON lines")
+    parser.add_argument("--stats-csv", metavar="PATH", help="write a CSV summary of stage timings")
+    parser.add_argument("--profile", choices=["cprofile", "tracemalloc"],
+                        help="profile every file and keep the slowest (see --profile-count)")
+    parser.add_argument("--profile-count", type=int, default=10, help="number of slowest files to keep profiles of")
+    parser.add_argument("--profile-dir", default="profiles", help="directory to write profiles to")
+    parser.add_argument("--watch", action="store_true",
+                        help="keep running and reprocess input files whenever they change")
+    parser.add_argument("--list-spells", action="store_true", help="list available spells and exit")
+    parser.add_argument("-v", "--verbose", action="store_true", help="log every file")
+    return parser
+
+
+def parse_options(values):
+    options = {}
+    for value in values:
+        name, separator, option_value = value.partition("=")
+        if not separator or not name:
+            raise ValueError(f"Invalid option {value!r}, expected NAME=VALUE.")
+        options[name.strip()] = option_value
+    return options
+
+
+def list_spells():
+    spells_by_category = {}
+    for spell_name, spell in get_spell_manager().spells.items():
+        spells_by_category.setdefault(spell.category, []).append(spell_name)
+    for category, spell_names in sorted(spells_by_category.items()):
+        print(f"{category}:")
+        for spell_name in sorted(spell_names):
+            print(f"  {spell_name}")
+
+
+def configure_io_manager(io_manager, args):
+    io_manager.input_paths = list(args.inputs)
+    io_manager.output_dir = args.output_dir
+    io_manager.include_subdirs = args.include_subdirs
+    io_manager.skip_errors = args.skip_errors
+    io_manager.filter_enabled = args.filter is not None
+    io_manager.filter_regex = re.compile(args.filter) if args.filter is not None else None
+    io_manager.rename_enabled = args.rename is not None
+    io_manager.rename_regex = re.compile(args.rename) if args.rename is not None else None
+    io_manager.only_modified = args.only_modified
+    io_manager.incremental = args.incremental
+    io_manager.header_index_path = args.header_index
+    io_manager.deduplicate = args.dedup
+    io_manager.pack_archives = args.pack
+    io_manager.spell_options = parse_options(args.options)
+    io_manager.workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+    io_manager.write_back = args.write_back
+    if args.large_file_size is not None:
+        io_manager.large_file_size = args.large_file_size << 20
+    io_manager.memory_limit = args.memory_limit << 20 if args.memory_limit else None
+
+
+def build_instrumentation(args):
+    sinks = []
+    if args.stats_jsonl:
+        sinks.append(JsonLinesSink(args.stats_jsonl))
+    if args.stats_csv:
+        sinks.append(CsvSummarySink(args.stats_csv))
+    if args.profile:
+        sinks.append(SlowestProfilesSink(args.profile_dir, args.profile_count))
+    if not sinks:
+        return None
+    return Instrumentation(sinks, args.profile)
+
+
+def build_report(args):
+    if not (args.analyze or args.report_jsonl or args.report_csv):
+        return None
+    outputs = []
+    if args.report_jsonl:
+        outputs.append(JsonLinesReport.open(args.report_jsonl))
+    if args.report_csv:
+        outputs.append(CsvReport(args.report_csv))
+    if not outputs:
+        outputs.append(JsonLinesReport(sys.stdout))
+    return AnalysisReport(outputs)
+
+
+def print_summary(results, elapsed):
+    counts = Counter(result.status for result in results)
+    rate = len(results) / elapsed if elapsed > 0 else 0.0
+    print(f"{len(results)} files in {elapsed:.2f}s ({rate:.1f} files/s)")
+    for status, count in sorted(counts.items()):
+        print(f"  {status}: {count}")
+
+
+def print_watch_result(result):
+    if result.status != FAILED:
+        print(f"{result.status}: {result.input_path}")
+
+
+def watch(io_manager, spell, report):
+    # Imported here, as they add much of the startup time of runs that do not watch.
+    import asyncio
+
+    from pynichon.io.watch import Watcher
+
+    print("Watching for changes, press Ctrl+C to stop.")
+    watcher = Watcher(io_manager, spell, callback=print_watch_result, report=report)
+    try:
+        asyncio.run(watcher.run())
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        print(f"error: {e}", file=sys.stderr)
+        return EXIT_FILE_ERRORS
+    print(f"Processed {watcher.processed} changed files.")
+    if report:
+        print(report.summary())
+    return EXIT_OK
+
+
+def main(argv=None):
+    """Run the command line interface and return the exit status."""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(format="%(message)s", level=logging.INFO if args.verbose else logging.WARNING)
+
+    if args.list_spells:
+        list_spells()
+        return EXIT_OK
+    if not args.inputs or not args.spells:
+        parser.print_usage(sys.stderr)
+        print("error: at least one input and one --spell are required", file=sys.stderr)
+        return EXIT_USAGE
+
+    io_manager = get_io_manager()
+    spell = args.spells[0] if len(args.spells) == 1 else args.spells
+    try:
+        configure_io_manager(io_manager, args)
+        get_spell_manager().resolve(spell).options_model().snapshot(io_manager.spell_options)
+    except (ValueError, re.error) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return EXIT_USAGE
+
+    if io_manager.memory_limit and not memory_limits_supported():
+        print("warning: memory limits are not supported on this platform", file=sys.stderr)
+
+    missing_inputs = [path for path in args.inputs if not os.path.exists(path)]
+    if missing_inputs:
+        print(f"error: input not found: {', '.join(missing_inputs)}", file=sys.stderr)
+        return EXIT_USAGE
+
+    if args.watch and (args.pack or args.dedup or args.incremental):
+        print("error: --watch cannot be combined with --pack, --dedup or --incremental", file=sys.stderr)
+        return EXIT_USAGE
+
+    report = build_report(args)
+    if args.watch:
+        return watch(io_manager, spell, report)
+
+    instrumentation = build_instrumentation(args)
+    start_time = time.perf_counter()
+    try:
+        results = io_manager.process_files(spell, instrumentation=instrumentation, report=report)
+    except KeyboardInterrupt:
+        print("Interrupted.", file=sys.stderr)
+        return EXIT_INTERRUPTED
+    except Exception as e:
+        print(f"error: {e}", file=sys.stderr)
+        return EXIT_FILE_ERRORS
+
+    print_summary(results, time.perf_counter() - start_time)
+    if instrumentation:
+        print(instrumentation.summary())
+    if report:
+        print(report.summary())
+    if io_manager.deduplicator:
+        print(io_manager.deduplicator.summary())
+    return EXIT_FILE_ERRORS if any(result.status == FAILED for result in results) else EXIT_OK
@@ -1,13 +1,14 @@
-import json
+import os
 
 from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QIcon, QColor, QFont
 from PyQt5.QtWidgets import (
     QWidget, QVBoxLayout, QGridLayout, QHBoxLayout, QLabel, QLineEdit,
     QCheckBox, QPushButton, QListWidget, QScrollArea, QGroupBox, QListWidgetItem, QRadioButton, QComboBox,
-    QTableWidget, QHeaderView
+    QTableWidget, QHeaderView, QSpinBox, QProgressBar
 )
 
+from pynichon.gui.spell_runner import SpellRunner
 from pynichon.io.io_manager import get_io_manager
 from pynichon.utils.spell_manager import get_spell_manager
 
@@ -22,6 +23,9 @@ class MainWindow(QWidget):
         self.spell_manager = get_spell_manager()
 
         self.current_spell = None
+        self.option_widgets = {}
+        self.spell_runner = None
+        self.error_count = 0
 
         self.setWindowTitle("PyNiChon")
         self.resize(1000, 600)
@@ -41,6 +45,11 @@ class MainWindow(QWidget):
         self.cb_filter = QCheckBox("Filter File Names")
         self.cb_rename = QCheckBox("Rename Files")
         self.cb_only_modified = QCheckBox("Output Only Modified Files")
+        self.cb_incremental = QCheckBox("Skip Already Processed Files")
+
+        self.sb_workers = QSpinBox()
+        self.sb_workers.setRange(1, os.cpu_count() or 1)
+        self.sb_workers.setValue(1)
 
         self.l_spells = QListWidget()
 
@@ -53,6 +62,10 @@ class MainWindow(QWidget):
         self.scroll_area.setWidget(self.gb_spell_options)
 
         self.b_run = QPushButton("Run")
+        self.b_pause = QPushButton("Pause")
+        self.b_cancel = QPushButton("Cancel")
+        self.pb_progress = QProgressBar()
+        self.l_status = QLabel("")
 
         self.create_layout()
 
@@ -65,6 +78,9 @@ class MainWindow(QWidget):
         self.populate_spells_list()
         self.l_spells.currentItemChanged.connect(self.update_spell_options)
         self.b_run.clicked.connect(self.run_spell)
+        self.b_pause.clicked.connect(self.toggle_pause)
+        self.b_cancel.clicked.connect(self.cancel_spell)
+        self.set_running(False)
 
         for parent_checkbox in self.checkbox_to_widgets.keys():
             parent_checkbox.stateChanged.connect(self.toggle_widgets)
@@ -97,6 +113,8 @@ class MainWindow(QWidget):
 
         top_layout.addWidget(self.cb_include_subdirs, 0, 2)
 
+        top_layout.addWidget(self.cb_incremental, 0, 3)
+
         top_layout.addWidget(self.cb_skip_errors, 0, 4)
 
         top_layout.addWidget(self.tb_filter, 0, 5)
@@ -108,6 +126,9 @@ class MainWindow(QWidget):
 
         top_layout.addWidget(self.cb_only_modified, 1, 2)
 
+        top_layout.addWidget(QLabel("Workers:"), 1, 3)
+        top_layout.addWidget(self.sb_workers, 1, 4)
+
         top_layout.addWidget(self.tb_rename, 1, 5)
 
         top_layout.addWidget(self.cb_rename, 1, 6)
@@ -133,8 +154,19 @@ class MainWindow(QWidget):
         """
         Create bottom layout of main window.
         """
-        bottom_layout = QHBoxLayout()
-        bottom_layout.addWidget(self.b_run)
+        bottom_layout = QVBoxLayout()
+
+        progress_layout = QHBoxLayout()
+        progress_layout.addWidget(self.pb_progress)
+        progress_layout.addWidget(self.l_status)
+        bottom_layout.addLayout(progress_layout)
+
+        buttons_layout = QHBoxLayout()
+        buttons_layout.addWidget(self.b_run)
+        buttons_layout.addWidget(self.b_pause)
+        buttons_layout.addWidget(self.b_cancel)
+        bottom_layout.addLayout(buttons_layout)
+
         return bottom_layout
 
     def toggle_widgets(self):
@@ -179,9 +211,11 @@ class MainWindow(QWidget):
             child = self.options_layout.takeAt(0)
             if child.widget():
                 child.widget().deleteLater()
+        self.option_widgets = {}
 
         for option in options:
             widget = None
+            name = option.get("Name", option.get("Label"))
             row = option.get("Style", {}).get("Row", 0)
             col = option.get("Style", {}).get("Column", 0)
             row_span = option.get("Style", {}).get("Height", 1)
@@ -190,26 +224,32 @@ class MainWindow(QWidget):
             if option["Type"] == "Checkbox":
                 widget = QCheckBox(option["Label"])
                 widget.setChecked(option.get("Default", False))
+                self.option_widgets[name] = (option["Type"], widget)
 
             elif option["Type"] == "Textbox":
                 widget = QLineEdit()
                 widget.setPlaceholderText(option.get("Placeholder", ""))
                 widget.setText(option.get("Default", ""))
+                self.option_widgets[name] = (option["Type"], widget)
                 self.options_layout.addWidget(widget, row, col, row_span, col_span)
 
             elif option["Type"] == "Dropdown":
                 widget = QComboBox()
                 widget.addItems(option.get("Options", []))
                 widget.setCurrentText(option.get("Default", ""))
+                self.option_widgets[name] = (option["Type"], widget)
 
             elif option["Type"] == "Radio Buttons":
                 group = QGroupBox(option["Label"])
                 layout = QVBoxLayout()
+                buttons = []
                 for btn_label in option.get("Options", []):
                     btn = QRadioButton(btn_label)
                     if btn_label == option.get("Default"):
                         btn.setChecked(True)
                     layout.addWidget(btn)
+                    buttons.append(btn)
+                self.option_widgets[name] = (option["Type"], buttons)
                 group.setLayout(layout)
                 widget = group
 
@@ -229,6 +269,7 @@ class MainWindow(QWidget):
 
                 table = QTableWidget(initial_rows, len(columns))
                 table.setHorizontalHeaderLabels([col["Label"] for col in columns])
+                self.option_widgets[name] = (option["Type"], table)
 
                 # Populate table rows with appropriate widgets
                 for r in range(initial_rows):
@@ -287,23 +328,126 @@ class MainWindow(QWidget):
                 if option["Type"] not in ["Textbox", "Table"]:
                     self.options_layout.addWidget(widget, row, col, alignment)
 
+    def get_spell_option_values(self):
+        """Read the current values of the spell option widgets."""
+        values = {}
+        for name, (option_type, widget) in self.option_widgets.items():
+            if option_type == "Checkbox":
+                values[name] = widget.isChecked()
+            elif option_type == "Textbox":
+                # Left empty, the option keeps its default.
+                if widget.text():
+                    values[name] = widget.text()
+            elif option_type == "Dropdown":
+                values[name] = widget.currentText()
+            elif option_type == "Radio Buttons":
+                checked = [button.text() for button in widget if button.isChecked()]
+                if checked:
+                    values[name] = checked[0]
+            elif option_type == "Table":
+                rows = []
+                for r in range(widget.rowCount()):
+                    cells = [widget.cellWidget(r, c) for c in range(widget.columnCount())]
+                    rows.append([cell.isChecked() if isinstance(cell, QCheckBox) else cell.text() if cell else ""
+                                 for cell in cells])
+                values[name] = rows
+        return values
+
     def update_spell_options(self, current_item):
         """Update the options panel for the selected spell."""
         self.current_spell = self.l_spells.currentItem().text()
 
-        json_path = self.spell_manager.spells[self.current_spell].json_path
-        if json_path:
-            with open(json_path, "r") as f:
-                spell_config = json.load(f)
-                self.populate_spell_options(spell_config.get("Options", {}))
+        try:
+            # The options of a pipeline include those of its stages.
+            options = self.spell_manager.spells[self.current_spell].options_model().options
+        except ValueError as e:
+            print(f"Error loading options of {self.current_spell}: {e}")
+            options = []
+        self.populate_spell_options(options)
 
     def run_spell(self):
+        if self.spell_runner:
+            return
         if not self.l_spells.currentItem():
             print("No valid spell selected.")
             return
 
         self.io_manager.set_settings_from_window(self)
-        self.io_manager.process_files(self.current_spell)
+        self.start_spell_runner()
+
+    def start_spell_runner(self):
+        """Run the current spell on a background thread."""
+        self.error_count = 0
+        self.spell_runner = SpellRunner(self.io_manager, self.current_spell)
+        self.spell_runner.progress.connect(self.update_progress)
+        self.spell_runner.file_failed.connect(self.on_file_failed)
+        self.spell_runner.finished.connect(self.on_spell_finished)
+        self.spell_runner.failed.connect(self.on_spell_failed)
+        self.spell_runner.thread.finished.connect(self.on_runner_stopped)
+
+        self.pb_progress.setRange(0, 0)
+        self.l_status.setText("Starting...")
+        self.set_running(True)
+        self.spell_runner.start()
+
+    def set_running(self, running):
+        self.b_run.setEnabled(not running)
+        self.b_pause.setEnabled(running)
+        self.b_cancel.setEnabled(running)
+        self.b_pause.setText("Pause")
+
+    def toggle_pause(self):
+        if not self.spell_runner:
+            return
+        if self.spell_runner.control.is_paused:
+            self.spell_runner.resume()
+            self.b_pause.setText("Pause")
+        else:
+            self.spell_runner.pause()
+            self.b_pause.setText("Resume")
+
+    def cancel_spell(self):
+        if self.spell_runner:
+            self.spell_runner.cancel()
+            self.l_status.setText("Cancelling...")
+
+    def update_progress(self, done, discovered, discovery_done, rate, eta, current_file):
+        """Show progress, throughput, ETA and errors of the running batch."""
+        if discovery_done:
+            self.pb_progress.setRange(0, max(discovered, 1))
+            self.pb_progress.setValue(done)
+            eta_text = f"ETA {int(eta // 60)}:{int(eta % 60):02d}" if eta >= 0 else "ETA --:--"
+        else:
+            # Still discovering files, so the total is not known yet.
+            self.pb_progress.setRange(0, 0)
+            eta_text = "ETA --:--"
+        self.l_status.setText(
+            f"{done}/{discovered} files | {rate:.1f} files/s | {eta_text} | "
+            f"{self.error_count} errors | {current_file}")
+
+    def on_file_failed(self, file_path, error):
+        # IOManager.report_result already prints the error.
+        self.error_count += 1
+
+    def on_spell_finished(self, results):
+        cancelled = self.spell_runner.control.is_cancelled
+        self.l_status.setText(
+            f"{'Cancelled' if cancelled else 'Finished'}: {len(results)} files, {self.error_count} errors")
+
+    def on_spell_failed(self, error):
+        self.l_status.setText(f"Failed: {error}")
+
+    def on_runner_stopped(self):
+        self.spell_runner.thread.wait()
+        self.spell_runner = None
+        self.set_running(False)
+
+    def closeEvent(self, event):
+        """Cancel a running batch and wait for it before closing."""
+        if self.spell_runner:
+            self.spell_runner.cancel()
+            self.spell_runner.thread.wait()
+        super().closeEvent(event)
 
     def dragEnterEvent(self, event):
         """Allow drag-and-drop for files and folders."""
@@ -314,6 +458,8 @@ class MainWindow(QWidget):
 
     def dropEvent(self, event):
         """Drag-and-drop event handler for files and folders."""
+        if self.spell_runner:
+            return
         if not self.l_spells.currentItem():
             print("No valid spell selected.")
             return
@@ -321,8 +467,8 @@ class MainWindow(QWidget):
         paths = [url.toLocalFile() for url in event.mimeData().urls()]
 
         self.io_manager.set_settings_from_window(self)
-        self.io_manager.input_dirs = paths
-        self.io_manager.process_files(self.current_spell)
+        self.io_manager.input_paths = paths
+        self.start_spell_runner()
 
 
 main_window = None
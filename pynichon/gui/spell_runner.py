@@ -0,0 +1,74 @@
+import os
+import time
+
+from PyQt5.QtCore import QObject, QThread, pyqtSignal
+
+from pynichon.io.batch import BatchControl, FAILED
+
+
+class SpellRunner(QObject):
+    """Runs IOManager.process_files on a background thread and reports progress through signals."""
+
+    # done, discovered, discovery finished, files per second, ETA in seconds (-1 if unknown), current file
+    progress = pyqtSignal(int, int, bool, float, float, str)
+    file_failed = pyqtSignal(str, str)
+    finished = pyqtSignal(list)
+    failed = pyqtSignal(str)
+
+    # Minimum time between progress signals, so large batches don't flood the event loop.
+    PROGRESS_INTERVAL = 0.1
+
+    def __init__(self, io_manager, spell):
+        super().__init__()
+        self.io_manager = io_manager
+        self.spell = spell
+        self.control = BatchControl()
+        self.thread = QThread()
+        self.moveToThread(self.thread)
+        self.thread.started.connect(self.run)
+        self.finished.connect(self.thread.quit)
+        self.failed.connect(self.thread.quit)
+
+    def start(self):
+        self.thread.start()
+
+    def pause(self):
+        self.control.pause()
+
+    def resume(self):
+        self.control.resume()
+
+    def cancel(self):
+        self.control.cancel()
+
+    def run(self):
+        start_time = time.perf_counter()
+        last_emit = 0.0
+        done = 0
+
+        def on_result(result):
+            nonlocal done, last_emit
+            done += 1
+            if result.status == FAILED:
+                self.file_failed.emit(result.input_path, result.error or "")
+
+            now = time.perf_counter()
+            if now - last_emit < self.PROGRESS_INTERVAL and result.status != FAILED:
+                return
+            last_emit = now
+
+            rate = done / (now - start_time) if now > start_time else 0.0
+            remaining = max(self.control.discovered - done, 0)
+            eta = remaining / rate if rate > 0 else -1.0
+            self.progress.emit(done, self.control.discovered, self.control.discovery_done, rate, eta,
+                               os.path.basename(result.input_path))
+
+        try:
+            results = self.io_manager.process_files(self.spell, control=self.control, callback=on_result)
+        except Exception as e:
+            self.failed.emit(str(e))
+            return
+
+        elapsed = time.perf_counter() - start_time
+        self.progress.emit(done, done, True, done / elapsed if elapsed > 0 else 0.0, 0.0, "")
+        self.finished.emit(results)
@@ -0,0 +1,484 @@
+"""
+Reading and writing Bethesda BSA and BA2 archives.
+
+Supported are BSA versions 103 (Oblivion), 104 (Fallout 3, New Vegas and Skyrim)
+and 105 (Skyrim Special Edition), and general (GNRL) BA2 archives of Fallout 4.
+Texture (DX10) BA2 archives are read as holding no files, as they contain no
+meshes. The index is read once when an archive is opened, and each file is read
+on demand with a single seek and read. Skyrim Special Edition archives are
+compressed with LZ4, which needs the optional lz4 package.
+"""
+
+import os
+import struct
+import zlib
+
+ARCHIVE_EXTENSIONS = (".bsa", ".ba2")
+
+BSA_MAGIC = b"BSA\x00"
+BA2_MAGIC = b"BTDX"
+
+# BSA archive flags
+BSA_DIRECTORY_NAMES = 0x1
+BSA_FILE_NAMES = 0x2
+BSA_COMPRESSED = 0x4
+BSA_EMBED_NAMES = 0x100
+
+# BSA file flags, by the content they mark an archive as holding.
+BSA_CONTENT_FLAGS = {".nif": 0x1, ".dds": 0x2, ".xml": 0x4, ".wav": 0x8, ".mp3": 0x10, ".txt": 0x20,
+                     ".bat": 0x20, ".scc": 0x20, ".spt": 0x40, ".tex": 0x80, ".fnt": 0x80, ".ctl": 0x100}
+
+# File size bit that inverts the archive's default compression for one file.
+BSA_TOGGLE_COMPRESSION = 0x40000000
+BSA_SIZE_MASK = 0x3FFFFFFF
+
+BA2_HEADER = struct.Struct("<4sI4sIQ")
+BA2_RECORD = struct.Struct("<I4sIIQIII")
+BA2_RECORD_ALIGN = 0xBAADF00D
+BA2_DEFAULT_FLAGS = 0x00100100
+
+
+class ArchiveError(Exception):
+    """Raised when an archive cannot be read or written."""
+
+
+def normalize_name(name):
+    """Return a path as archives store it: lowercase, with backslashes."""
+    return name.replace("/", "\\").lower()
+
+
+def _encode(name):
+    return name.encode("cp1252", errors="replace")
+
+
+def bsa_hash(name, is_folder=False):
+    """Return the hash BSA archives identify and sort folders and files by."""
+    name = normalize_name(name)
+    root, ext = (name, "") if is_folder else os.path.splitext(name)
+    chars = _encode(root)
+    ext_chars = _encode(ext)
+    length = len(chars)
+
+    low = 0
+    if length:
+        low = chars[-1] | ((chars[-2] if length > 2 else 0) << 8) | (length << 16) | (chars[0] << 24)
+    low |= {".kf": 0x80, ".nif": 0x8000, ".dds": 0x8080, ".wav": 0x80000000}.get(ext, 0)
+
+    high = 0
+    for char in chars[1:-2]:
+        high = (high * 0x1003F + char) & 0xFFFFFFFF
+    ext_hash = 0
+    for char in ext_chars:
+        ext_hash = (ext_hash * 0x1003F + char) & 0xFFFFFFFF
+    high = (high + ext_hash) & 0xFFFFFFFF
+    return (high << 32) | low
+
+
+def _crc_table():
+    table = []
+    for i in range(256):
+        crc = i
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xEDB88320 if crc & 1 else crc >> 1
+        table.append(crc)
+    return table
+
+
+_CRC_TABLE = _crc_table()
+
+
+def ba2_hash(name):
+    """Return the CRC-32 (without pre- and post-inversion) BA2 archives hash names with."""
+    crc = 0
+    for char in _encode(normalize_name(name)):
+        crc = (crc >> 8) ^ _CRC_TABLE[(crc ^ char) & 0xFF]
+    return crc
+
+
+def _lz4():
+    try:
+        import lz4.frame
+    except ImportError:
+        raise ArchiveError("Skyrim Special Edition archives are compressed with LZ4; install the lz4 package.")
+    return lz4.frame
+
+
+class ArchiveEntry:
+    """A file in an archive, located by the archive's index."""
+
+    def __init__(self, name, offset, size, compressed, original_size=None, flags=0):
+        self.name = name
+        self.offset = offset
+        self.size = size
+        self.compressed = compressed
+        self.original_size = original_size
+        self.flags = flags
+
+    def __repr__(self):
+        return f"ArchiveEntry({self.name!r})"
+
+
+class _Archive:
+    """Common handling of the archive file, which is opened on first read."""
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = []
+        self._stream = None
+
+    def __getstate__(self):
+        # The open file is not carried to worker processes, only the index.
+        state = self.__dict__.copy()
+        state["_stream"] = None
+        return state
+
+    def _read_at(self, offset, size):
+        if self._stream is None:
+            self._stream = open(self.path, "rb")
+        self._stream.seek(offset)
+        data = self._stream.read(size)
+        if len(data) != size:
+            raise ArchiveError(f"{self.path} is truncated.")
+        return data
+
+    def read(self, entry):
+        """Return the uncompressed contents of an entry."""
+        raise NotImplementedError
+
+    def read_raw(self, entry):
+        """Return an entry's data as stored, possibly compressed."""
+        raise NotImplementedError
+
+    def close(self):
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+
+
+class BsaArchive(_Archive):
+    """A BSA archive (versions 103 to 105)."""
+
+    def __init__(self, path):
+        super().__init__(path)
+        with open(path, "rb") as f:
+            self._read_index(f)
+
+    def _read_index(self, f):
+        header = f.read(36)
+        if len(header) != 36 or header[:4] != BSA_MAGIC:
+            raise ArchiveError(f"{self.path} is not a BSA archive.")
+        (_, self.version, folders_offset, self.archive_flags, folder_count, file_count,
+         folder_names_length, file_names_length, self.file_flags) = struct.unpack("<4s8I", header)
+        if self.version not in (103, 104, 105):
+            raise ArchiveError(f"Unsupported BSA version {self.version} in {self.path}.")
+
+        f.seek(folders_offset)
+        record_size = 24 if self.version == 105 else 16
+        folder_records = f.read(record_size * folder_count)
+        file_counts = [struct.unpack_from("<QI", folder_records, i * record_size)[1] for i in range(folder_count)]
+
+        files = []
+        for file_count_in_folder in file_counts:
+            folder_name = ""
+            if self.archive_flags & BSA_DIRECTORY_NAMES:
+                length = f.read(1)[0]
+                folder_name = f.read(length)[:-1].decode("cp1252")
+            records = f.read(16 * file_count_in_folder)
+            for i in range(file_count_in_folder):
+                _, size, offset = struct.unpack_from("<QII", records, i * 16)
+                files.append((folder_name, size, offset))
+
+        names = [""] * len(files)
+        if self.archive_flags & BSA_FILE_NAMES:
+            names = [name.decode("cp1252") for name in f.read(file_names_length).split(b"\x00")[:len(files)]]
+        if len(files) != file_count or len(names) != len(files):
+            raise ArchiveError(f"{self.path} has a corrupt index.")
+
+        compressed_by_default = bool(self.archive_flags & BSA_COMPRESSED)
+        for (folder_name, size, offset), name in zip(files, names):
+            full_name = f"{folder_name}\\{name}" if folder_name else name
+            compressed = compressed_by_default != bool(size & BSA_TOGGLE_COMPRESSION)
+            size &= BSA_SIZE_MASK
+            if self.embeds_names:
+                # The stored data starts with the file's full path.
+                name_length = 1 + len(_encode(full_name))
+                offset += name_length
+                size -= name_length
+            self.entries.append(ArchiveEntry(full_name, offset, size, compressed,
+                                             None if compressed else size))
+
+    @property
+    def embeds_names(self):
+        return self.version >= 104 and bool(self.archive_flags & BSA_EMBED_NAMES)
+
+    def read_raw(self, entry):
+        return self._read_at(entry.offset, entry.size)
+
+    def read(self, entry):
+        data = self.read_raw(entry)
+        if not entry.compressed:
+            return data
+        original_size = struct.unpack_from("<I", data)[0]
+        try:
+            if self.version == 105:
+                data = _lz4().decompress(data[4:])
+            else:
+                data = zlib.decompress(data[4:])
+        except (zlib.error, RuntimeError) as e:
+            raise ArchiveError(f"Cannot decompress {entry.name} in {self.path}: {e}")
+        if len(data) != original_size:
+            raise ArchiveError(f"{entry.name} in {self.path} has the wrong size.")
+        return data
+
+    def writer(self):
+        """Return a BsaWriter producing archives with this archive's settings."""
+        return BsaWriter(self.version, self.archive_flags, self.file_flags)
+
+
+class Ba2Archive(_Archive):
+    """A general (GNRL) BA2 archive. Texture (DX10) archives are read as empty."""
+
+    def __init__(self, path):
+        super().__init__(path)
+        with open(path, "rb") as f:
+            self._read_index(f)
+
+    def _read_index(self, f):
+        header = f.read(BA2_HEADER.size)
+        if len(header) != BA2_HEADER.size or header[:4] != BA2_MAGIC:
+            raise ArchiveError(f"{self.path} is not a BA2 archive.")
+        _, self.version, self.archive_type, file_count, names_offset = BA2_HEADER.unpack(header)
+        if self.version not in (1, 7, 8):
+            raise ArchiveError(f"Unsupported BA2 version {self.version} in {self.path}.")
+        if self.archive_type != b"GNRL":
+            return
+
+        records = f.read(BA2_RECORD.size * file_count)
+        f.seek(names_offset)
+        names = []
+        for _ in range(file_count):
+            length = struct.unpack("<H", f.read(2))[0]
+            names.append(f.read(length).decode("cp1252"))
+
+        for i, name in enumerate(names):
+            _, _, _, flags, offset, packed_size, size, _ = BA2_RECORD.unpack_from(records, i * BA2_RECORD.size)
+            self.entries.append(ArchiveEntry(
+                name, offset, packed_size or size, bool(packed_size), size, flags))
+
+    def read_raw(self, entry):
+        return self._read_at(entry.offset, entry.size)
+
+    def read(self, entry):
+        data = self.read_raw(entry)
+        if not entry.compressed:
+            return data
+        try:
+            data = zlib.decompress(data)
+        except zlib.error as e:
+            raise ArchiveError(f"Cannot decompress {entry.name} in {self.path}: {e}")
+        if len(data) != entry.original_size:
+            raise ArchiveError(f"{entry.name} in {self.path} has the wrong size.")
+        return data
+
+    def writer(self):
+        """Return a Ba2Writer producing archives with this archive's settings."""
+        if self.archive_type != b"GNRL":
+            raise ArchiveError(f"Writing {self.archive_type.decode()} BA2 archives is not supported.")
+        return Ba2Writer(self.version)
+
+
+def open_archive(path):
+    """Open a BSA or BA2 archive, reading its index."""
+    with open(path, "rb") as f:
+        magic = f.read(4)
+    if magic == BSA_MAGIC:
+        return BsaArchive(path)
+    if magic == BA2_MAGIC:
+        return Ba2Archive(path)
+    raise ArchiveError(f"{path} is not a BSA or BA2 archive.")
+
+
+def is_archive(path):
+    return path.lower().endswith(ARCHIVE_EXTENSIONS) and os.path.isfile(path)
+
+
+class _Writer:
+    """
+    Collects files for a new archive and writes it in one pass.
+
+    Added data is compressed (if the archive compresses) and kept in memory, while
+    files copied from another archive with add_raw are read from it as the new
+    archive is written, without being decompressed.
+    """
+
+    def __init__(self):
+        self.files = {}
+
+    def add_raw(self, source, entry):
+        """Copy an entry of a source archive of the same kind as stored."""
+        self.files[normalize_name(entry.name)] = (entry.size, entry.compressed, entry.original_size, entry.flags,
+                                                  (source, entry))
+
+    def _stored_data(self, stored):
+        if isinstance(stored, bytes):
+            return stored
+        source, entry = stored
+        return source.read_raw(entry)
+
+    def write(self, path):
+        """Write the archive, replacing any file at path only once it is complete."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        temp_path = path + ".tmp"
+        try:
+            with open(temp_path, "wb") as f:
+                self._write(f)
+            # Release the sources, which may be the archive being replaced.
+            for *_, stored in self.files.values():
+                if not isinstance(stored, bytes):
+                    stored[0].close()
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+
+class BsaWriter(_Writer):
+    """Writes a BSA archive."""
+
+    def __init__(self, version=104, archive_flags=BSA_DIRECTORY_NAMES | BSA_FILE_NAMES, file_flags=None):
+        super().__init__()
+        if version not in (103, 104, 105):
+            raise ArchiveError(f"Unsupported BSA version {version}.")
+        self.version = version
+        self.archive_flags = archive_flags | BSA_DIRECTORY_NAMES | BSA_FILE_NAMES
+        self.file_flags = file_flags
+
+    @property
+    def embeds_names(self):
+        return self.version >= 104 and bool(self.archive_flags & BSA_EMBED_NAMES)
+
+    def add(self, name, data):
+        """Add a file with the given contents, compressing it if the archive compresses."""
+        if self.archive_flags & BSA_COMPRESSED:
+            packed = _lz4().compress(data) if self.version == 105 else zlib.compress(data)
+            stored = struct.pack("<I", len(data)) + packed
+            self.files[normalize_name(name)] = (len(stored), True, len(data), 0, stored)
+        else:
+            self.files[normalize_name(name)] = (len(data), False, len(data), 0, bytes(data))
+
+    def _write(self, f):
+        folders = {}
+        for name in self.files:
+            folder, _, file_name = name.rpartition("\\")
+            folders.setdefault(folder, []).append(file_name)
+        ordered = sorted(
+            ((bsa_hash(folder, is_folder=True), folder,
+              sorted((bsa_hash(file_name), file_name) for file_name in file_names))
+             for folder, file_names in folders.items()))
+
+        folder_names_length = sum(len(_encode(folder)) + 1 for _, folder, _ in ordered)
+        file_names_length = sum(len(_encode(file_name)) + 1 for name in self.files
+                                for file_name in [name.rpartition("\\")[2]])
+        file_flags = self.file_flags
+        if file_flags is None:
+            file_flags = 0
+            for name in self.files:
+                file_flags |= BSA_CONTENT_FLAGS.get(os.path.splitext(name)[1], 0)
+
+        record_size = 24 if self.version == 105 else 16
+        folders_offset = 36
+        file_records_offset = folders_offset + record_size * len(ordered)
+        data_offset = (file_records_offset + sum(len(_encode(folder)) + 2 for _, folder, _ in ordered)
+                       + 16 * len(self.files) + file_names_length)
+
+        folder_records = []
+        file_blocks = []
+        data_order = []
+        block_offset = file_records_offset
+        offset = data_offset
+        compressed_by_default = bool(self.archive_flags & BSA_COMPRESSED)
+        for folder_hash, folder, file_names in ordered:
+            # Folder offsets famously include the length of the file names block.
+            if self.version == 105:
+                folder_records.append(struct.pack("<QIIQ", folder_hash, len(file_names), 0,
+                                                  block_offset + file_names_length))
+            else:
+                folder_records.append(struct.pack("<QII", folder_hash, len(file_names),
+                                                  block_offset + file_names_length))
+            block = bytearray(struct.pack("<B", len(_encode(folder)) + 1) + _encode(folder) + b"\x00")
+            for file_hash, file_name in file_names:
+                name = f"{folder}\\{file_name}" if folder else file_name
+                size, compressed, _, _, _ = self.files[name]
+                if self.embeds_names:
+                    size += 1 + len(_encode(name))
+                size_field = size | (BSA_TOGGLE_COMPRESSION if compressed != compressed_by_default else 0)
+                block += struct.pack("<QII", file_hash, size_field, offset)
+                data_order.append(name)
+                offset += size
+            file_blocks.append(bytes(block))
+            block_offset += len(block)
+
+        f.write(struct.pack("<4s8I", BSA_MAGIC, self.version, folders_offset, self.archive_flags, len(ordered),
+                            len(self.files), folder_names_length, file_names_length, file_flags))
+        f.write(b"".join(folder_records))
+        f.write(b"".join(file_blocks))
+        f.write(b"".join(_encode(name.rpartition("\\")[2]) + b"\x00" for name in data_order))
+        for name in data_order:
+            if self.embeds_names:
+                f.write(struct.pack("<B", len(_encode(name))) + _encode(name))
+            f.write(self._stored_data(self.files[name][4]))
+
+
+class Ba2Writer(_Writer):
+    """Writes a general (GNRL) BA2 archive."""
+
+    def __init__(self, version=1, compressed=True):
+        super().__init__()
+        self.version = version
+        self.compressed = compressed
+
+    def add(self, name, data):
+        """Add a file with the given contents, compressing it if the archive compresses."""
+        if self.compressed:
+            stored = zlib.compress(data)
+            self.files[normalize_name(name)] = (len(stored), True, len(data), BA2_DEFAULT_FLAGS, stored)
+        else:
+            self.files[normalize_name(name)] = (len(data), False, len(data), BA2_DEFAULT_FLAGS, bytes(data))
+
+    def _write(self, f):
+        names = list(self.files)
+        data_offset = BA2_HEADER.size + BA2_RECORD.size * len(names)
+        names_offset = data_offset + sum(self.files[name][0] for name in names)
+
+        f.write(BA2_HEADER.pack(BA2_MAGIC, self.version, b"GNRL", len(names), names_offset))
+        offset = data_offset
+        for name in names:
+            size, compressed, original_size, flags, _ = self.files[name]
+            folder, _, file_name = name.rpartition("\\")
+            stem, ext = os.path.splitext(file_name)
+            f.write(BA2_RECORD.pack(ba2_hash(stem), _encode(ext[1:])[:4].ljust(4, b"\x00"), ba2_hash(folder),
+                                    flags or BA2_DEFAULT_FLAGS, offset, size if compressed else 0,
+                                    original_size, BA2_RECORD_ALIGN))
+            offset += size
+        for name in names:
+            f.write(self._stored_data(self.files[name][4]))
+        for name in names:
+            encoded = _encode(name)
+            f.write(struct.pack("<H", len(encoded)) + encoded)
+
+
+def repack_archive(archive, output_path, replacements):
+    """
+    Write a copy of an archive with some files replaced or added.
+
+    replacements maps archive paths to files on disk holding their new contents;
+    every other file is copied from the archive as stored.
+    """
+    writer = archive.writer()
+    for entry in archive.entries:
+        writer.add_raw(archive, entry)
+    for name, file_path in replacements.items():
+        with open(file_path, "rb") as f:
+            writer.add(name, f.read())
+    writer.write(output_path)
@@ -0,0 +1,262 @@
+import threading
+from collections import deque
+
+PROCESSED = "processed"
+FILTERED = "filtered"
+UNCHANGED = "unchanged"
+UP_TO_DATE = "up_to_date"
+NOT_APPLICABLE = "not_applicable"
+ANALYZED = "analyzed"
+FAILED = "error"
+
+# Files at least this large are processed in their own lane of a parallel batch, and
+# their output is serialized straight to disk instead of into memory.
+LARGE_FILE_SIZE = 64 << 20
+
+
+class FileResult:
+    """Outcome of processing a single input file."""
+
+    def __init__(self, input_path, output_path=None, status=PROCESSED, error=None):
+        self.input_path = input_path
+        self.output_path = output_path
+        self.status = status
+        self.error = error
+        self.input_hash = None
+        self.stats = None
+        self.profile = None
+        self.pending_write = None
+        self.findings = None
+        self.duplicate_of = None
+
+    def __repr__(self):
+        return f"FileResult({self.input_path!r}, status={self.status!r})"
+
+
+class BatchControl:
+    """
+    Cooperative pause and cancel for a running batch, usable from another thread.
+
+    The batch checks the control between files: while paused, no new files are
+    started, and once cancelled, the files not yet started are dropped. The number of
+    files discovered so far is tracked for progress reporting.
+    """
+
+    def __init__(self):
+        self.cancelled = threading.Event()
+        self.running = threading.Event()
+        self.running.set()
+        self.discovered = 0
+        self.discovery_done = False
+
+    def cancel(self):
+        self.cancelled.set()
+        self.running.set()
+
+    def pause(self):
+        self.running.clear()
+
+    def resume(self):
+        self.running.set()
+
+    @property
+    def is_paused(self):
+        return not self.running.is_set()
+
+    @property
+    def is_cancelled(self):
+        return self.cancelled.is_set()
+
+    def gate(self, items):
+        """Yield items while counting them, blocking while paused and stopping once cancelled."""
+        for item in items:
+            self.running.wait()
+            if self.cancelled.is_set():
+                return
+            self.discovered += 1
+            yield item
+        self.discovery_done = True
+
+
+class WriteBack:
+    """
+    Writes output files on a background thread, so disk latency overlaps with
+    processing the next files.
+
+    submit returns a future per write; it must be waited on before the file is
+    reported as written.
+    """
+
+    def __init__(self):
+        # Imported here as it is only needed when writing back.
+        from concurrent.futures import ThreadPoolExecutor
+
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pynichon-write")
+
+    def submit(self, data, file_path):
+        from pynichon.io.nif_io import NifFile
+
+        return self.executor.submit(NifFile.write_bytes, data, file_path)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+
+# Per-process state of a pool worker, set once by _init_worker.
+_worker_io_manager = None
+_worker_spell_function = None
+
+
+def memory_limits_supported():
+    try:
+        import resource
+    except ImportError:
+        return False
+    return hasattr(resource, "RLIMIT_AS")
+
+
+def set_memory_limit(limit):
+    """
+    Cap the address space of this process at limit bytes, where the platform
+    supports it. Allocations beyond the cap raise MemoryError.
+    """
+    if not memory_limits_supported():
+        return False
+    import resource
+
+    _, hard_limit = resource.getrlimit(resource.RLIMIT_AS)
+    if hard_limit != resource.RLIM_INFINITY:
+        limit = min(limit, hard_limit)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard_limit))
+    return True
+
+
+def _init_worker(io_manager, spell, memory_limit=None):
+    """Load the spell and the NIF format once when a worker process starts."""
+    from pynichon.io.nif_io import get_nif_format
+    from pynichon.utils.spell_manager import get_spell_manager
+
+    global _worker_io_manager, _worker_spell_function
+    if memory_limit:
+        set_memory_limit(memory_limit)
+    _worker_io_manager = io_manager
+    resolved_spell = get_spell_manager().resolve(spell)
+    resolved_spell.load()
+    _worker_spell_function = resolved_spell.bind(io_manager.options_snapshot)
+    get_nif_format()
+
+
+def _process_in_worker(file_path):
+    return _worker_io_manager.run_file(file_path, _worker_spell_function)
+
+
+def run_serial(io_manager, spell_function, items, write_back=False):
+    """
+    Process files one at a time in this process.
+
+    Items are file paths to process, or FileResults already settled upstream, which
+    are passed through in place. With write_back set, output files are written on a
+    background thread while the next files are processed; a bounded number of
+    results wait for their write, and a failed write turns its result into an error.
+    """
+    if not write_back:
+        for item in items:
+            if isinstance(item, FileResult):
+                yield item
+            else:
+                yield io_manager.run_file(item, spell_function)
+        return
+
+    writer = WriteBack()
+    window = 8
+    pending = deque()
+    try:
+        for item in items:
+            if not isinstance(item, FileResult):
+                item = io_manager.run_file(item, spell_function, writer)
+            pending.append(item)
+            while pending and (len(pending) > window or _is_written(pending[0])):
+                yield _finish_write(pending.popleft())
+        while pending:
+            yield _finish_write(pending.popleft())
+    finally:
+        writer.close()
+
+
+def run_parallel(io_manager, spell, items, workers):
+    """
+    Process files on a pool of worker processes.
+
+    Items are consumed lazily, so work starts while they are still being discovered,
+    and only a bounded number of files are in flight on the pool at a time. Workers
+    pull files from the pool's shared call queue, and results are yielded in input
+    order. Closing the generator cancels whatever has not started yet.
+
+    Files of at least io_manager.large_file_size bytes are sent to a separate
+    single-process lane, so only one of them is in memory at a time, and the pool
+    keeps processing the following files meanwhile. The pool's workers are capped at
+    io_manager.memory_limit bytes each, if set; the large-file lane is not.
+    """
+    # Imported here as it is comparatively slow to import and only needed for parallel runs.
+    from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                   initargs=(io_manager, spell, io_manager.memory_limit))
+    large_executor = None
+    window = workers * 4
+    pending = deque()
+    running = set()
+    try:
+        for item in items:
+            if isinstance(item, FileResult):
+                pending.append(item)
+            elif io_manager.is_large_file(item):
+                if large_executor is None:
+                    large_executor = ProcessPoolExecutor(max_workers=1, initializer=_init_worker,
+                                                         initargs=(io_manager, spell))
+                pending.append(large_executor.submit(_process_in_worker, item))
+            else:
+                future = executor.submit(_process_in_worker, item)
+                running.add(future)
+                pending.append(future)
+            while pending:
+                if _is_settled(pending[0]):
+                    yield _settle(pending.popleft())
+                    continue
+                # Results behind an unfinished file are held back, but the pool is kept busy.
+                running = {future for future in running if not future.done()}
+                if len(running) < window:
+                    break
+                wait(running, return_when=FIRST_COMPLETED)
+        while pending:
+            yield _settle(pending.popleft())
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        if large_executor:
+            large_executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _is_written(result):
+    return result.pending_write is None or result.pending_write.done()
+
+
+def _finish_write(result):
+    if result.pending_write is not None:
+        try:
+            result.pending_write.result()
+        except Exception as e:
+            result.status = FAILED
+            result.error = str(e)
+            result.output_path = None
+            if result.stats:
+                result.stats.count("errors")
+        result.pending_write = None
+    return result
+
+
+def _is_settled(item):
+    return isinstance(item, FileResult) or item.done()
+
+
+def _settle(item):
+    return item if isinstance(item, FileResult) else item.result()
@@ -0,0 +1,141 @@
+"""Running a spell once per unique input content in a batch."""
+
+import copy
+import os
+import shutil
+
+from pynichon.io.manifest import file_digest
+
+
+class Deduplicator:
+    """
+    Finds byte-identical inputs as they are discovered, so the spell runs once per
+    unique content and the result is reused for every copy.
+
+    The spell and its options are the same for every file of a batch, so the
+    content hash alone identifies the work. Only files sharing their size with an
+    earlier file are hashed. A duplicate is passed down the batch as a settled
+    FileResult pointing at its original, and resolved once the original's result
+    is in: its output is then hard-linked (mode "link", falling back to a copy) or
+    copied (mode "copy") from the original's output.
+    """
+
+    def __init__(self, mode="link"):
+        if mode not in ("link", "copy"):
+            raise ValueError(f"Unknown deduplication mode {mode}.")
+        self.mode = mode
+        self.first_by_size = {}
+        self.originals = {}
+        self.results = {}
+        self.duplicates = 0
+        self.bytes_skipped = 0
+        self.hashed = 0
+        self.processed = 0
+        self.processing_time = 0.0
+
+    def _digest(self, file_path):
+        self.hashed += 1
+        return file_digest(file_path)
+
+    def filter(self, items):
+        """Pass items through, replacing copies of an earlier input with duplicate results."""
+        from pynichon.io.batch import FileResult
+
+        for item in items:
+            if isinstance(item, FileResult):
+                yield item
+                continue
+
+            try:
+                size = os.path.getsize(item)
+            except OSError:
+                # Leave the error to be reported when the file is loaded.
+                yield item
+                continue
+            if size not in self.first_by_size:
+                self.first_by_size[size] = item
+                yield item
+                continue
+
+            first = self.first_by_size[size]
+            if first is not None:
+                self.originals.setdefault(self._digest(first), first)
+                self.first_by_size[size] = None
+            digest = self._digest(item)
+            original = self.originals.setdefault(digest, item)
+            if original == item:
+                yield item
+                continue
+
+            result = FileResult(item)
+            result.duplicate_of = original
+            result.input_hash = digest
+            self.bytes_skipped += size
+            yield result
+
+    def record(self, result):
+        """Keep the result of a processed file for copies of it later in the batch."""
+        # A copy, as the batch may change the result's output path for reporting.
+        self.results[result.input_path] = copy.copy(result)
+        if result.stats:
+            self.processed += 1
+            self.processing_time += result.stats.total
+
+    def resolve(self, result, output_path, in_place=False):
+        """
+        Settle a duplicate result from its original's result.
+
+        The original's output is linked or copied to output_path; in-place runs
+        always copy, so input files never end up sharing their storage.
+        """
+        from pynichon.io.batch import FAILED, FileResult
+
+        original = self.results.get(result.duplicate_of)
+        resolved = FileResult(result.input_path)
+        resolved.duplicate_of = result.duplicate_of
+        resolved.input_hash = result.input_hash
+        if original is None:
+            resolved.status = FAILED
+            resolved.error = f"Duplicate of {result.duplicate_of}, which was not processed."
+            return resolved
+
+        resolved.status = original.status
+        resolved.error = original.error
+        resolved.findings = original.findings
+        if original.output_path:
+            try:
+                self.place(original.output_path, output_path, in_place)
+                resolved.output_path = output_path
+            except OSError as e:
+                resolved.status = FAILED
+                resolved.error = str(e)
+                return resolved
+        self.duplicates += 1
+        return resolved
+
+    def place(self, source_path, output_path, in_place):
+        if os.path.abspath(source_path) == os.path.abspath(output_path):
+            return
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        if self.mode == "link" and not in_place:
+            temp_path = output_path + ".link.tmp"
+            try:
+                os.link(source_path, temp_path)
+                os.replace(temp_path, output_path)
+                return
+            except OSError:
+                # Different file system, or links are not supported there.
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+        temp_path = output_path + ".copy.tmp"
+        shutil.copyfile(source_path, temp_path)
+        os.replace(temp_path, output_path)
+
+    def summary(self):
+        """Return a short text summary of the work saved."""
+        line = (f"deduplicated {self.duplicates} files ({self.bytes_skipped / (1 << 20):.1f} MiB not processed, "
+                f"{self.hashed} files hashed)")
+        if self.processed:
+            saved = self.duplicates * self.processing_time / self.processed
+            line += f", about {saved:.2f}s of processing saved"
+        return line
@@ -1,8 +1,23 @@
+import hashlib
 import os
 import re
+import shutil
+import tempfile
+from contextlib import contextmanager
 
 from pynichon.utils.spell_manager import SpellManager
-from pynichon.io.nif_io import NifFile
+from pynichon.io.archive import is_archive, normalize_name, open_archive, repack_archive
+from pynichon.io.batch import (
+    LARGE_FILE_SIZE, FileResult, ANALYZED, FAILED, FILTERED, UNCHANGED, UP_TO_DATE, NOT_APPLICABLE,
+    run_parallel, run_serial
+)
+from pynichon.io.dedup import Deduplicator
+from pynichon.io.manifest import MANIFEST_NAME, Manifest
+from pynichon.io.nif_header import HeaderIndex
+from pynichon.io.nif_io import NifFile, NifError
+from pynichon.io.nif_splice import splice_nif
+from pynichon.io.report import collect_findings
+from pynichon.utils.instrumentation import NULL_STATS, FileProfiler, FileStats
 
 io_manager = None
 
@@ -17,8 +32,27 @@ class IOManager:
         self.filter_enabled = False
         self.rename_enabled = False
         self.only_modified = False
+        self.incremental = False
+        self.header_index_path = ""
+        self.extensions = (".nif", ".kf", ".btr", ".bto")
         self.filter_regex = None
         self.rename_regex = None
+        self.workers = 1
+        self.write_back = False
+        self.large_file_size = LARGE_FILE_SIZE
+        self.memory_limit = None
+        self.modified_types = None
+        self.spell_options = {}
+        self.options_snapshot = None
+        self.collect_stats = False
+        self.profile_mode = None
+        self.analyze = False
+        self.deduplicate = None
+        self.deduplicator = None
+        self.pack_archives = False
+        self.archives = {}
+        self.archive_members = {}
+        self.archive_outputs = {}
 
     def set_settings_from_window(self, window):
         self.input_paths.clear()
@@ -29,43 +63,397 @@ class IOManager:
         self.filter_enabled = window.cb_filter.isChecked()
         self.rename_enabled = window.cb_rename.isChecked()
         self.only_modified = window.cb_only_modified.isChecked()
+        self.incremental = window.cb_incremental.isChecked()
         self.filter_regex = re.compile(window.tb_filter.text())
         self.rename_regex = re.compile(window.tb_rename.text())
+        self.workers = window.sb_workers.value()
+        self.spell_options = window.get_spell_option_values()
 
-    def process_files(self, spell):
-        for file_path in self.input_paths:
-            try:
-                if os.path.isfile(file_path):
-                    self.process_file(file_path, spell)
-                elif os.path.isdir(file_path):
-                    for root, _, files in os.walk(file_path):
-                        if not self.include_subdirs and root != file_path:
-                            continue
-                        for file in files:
-                            full_path = os.path.join(root, file)
-                            self.process_file(full_path, spell)
-            except Exception as e:
-                print(f"Error processing file {file_path}: {str(e)}")
-                if self.skip_errors:
-                    print("Skipping file due to error.")
-                else:
-                    return
+    def process_files(self, spell, control=None, callback=None, instrumentation=None, report=None):
+        """
+        Process all input files with the given spell, or with each spell of a list
+        in order, and return a FileResult for each file in input order.
+
+        The callback is called with each result as it completes. A BatchControl
+        pauses or cancels the batch, an Instrumentation collects timings, and an
+        AnalysisReport runs the spell read-only and collects its findings.
+        """
+        resolved_spell, spell_function = self.prepare_run(spell, instrumentation, report)
+        self.open_archives()
+
+        items = self.iter_input_files()
+        manifest = None
+        if self.incremental and not self.analyze:
+            manifest = Manifest(self.get_manifest_path(), self.get_spell_key(spell, resolved_spell))
+            items = self.skip_current(items, manifest)
+        self.deduplicator = None
+        if self.deduplicate:
+            self.deduplicator = Deduplicator(self.deduplicate)
+            items = self.deduplicator.filter(items)
+        header_index = None
+        if resolved_spell.has_filter:
+            header_index = HeaderIndex(self.header_index_path or None)
+            items = self.filter_by_header(items, resolved_spell, header_index)
+        if control:
+            items = control.gate(items)
+
+        if self.workers > 1:
+            runner = run_parallel(self, spell, items, self.workers)
+        else:
+            runner = run_serial(self, spell_function, items, self.write_back)
+
+        results = []
+        try:
+            for result in runner:
+                if self.deduplicator:
+                    if result.duplicate_of:
+                        result = self.deduplicator.resolve(
+                            result, self.get_output_path(result.input_path), not self.output_dir)
+                    else:
+                        self.deduplicator.record(result)
+                if result.output_path and result.input_path in self.archive_members:
+                    # Staged outputs end up in the output archive once it is written.
+                    result.output_path = self.get_archive_output_path(result.output_path)
+                results.append(result)
+                self.report_result(result)
+                if manifest and result.input_path not in self.archive_members:
+                    manifest.update(result)
+                if instrumentation:
+                    instrumentation.record(result)
+                if report:
+                    report.record(result)
+                if callback:
+                    callback(result)
+                if result.status == FAILED and not self.skip_errors:
+                    break
+                if control and control.is_cancelled:
+                    break
+            runner.close()
+            if not (self.analyze or control and control.is_cancelled):
+                self.write_archives()
+        finally:
+            runner.close()
+            self.close_archives()
+            if manifest:
+                manifest.save()
+            if header_index:
+                header_index.save()
+            if instrumentation:
+                instrumentation.close()
+            if report:
+                report.close()
+        return results
+
+    def prepare_run(self, spell, instrumentation=None, report=None):
+        """Load the spell and validate its options for a run, and return it with its bound function."""
+        from pynichon.utils.spell_manager import get_spell_manager
+
+        resolved_spell = get_spell_manager().resolve(spell)
+        resolved_spell.load()
+        # Option values are validated once per run, and the snapshot is shared with every file.
+        self.options_snapshot = resolved_spell.options_model().snapshot(self.spell_options)
+        spell_function = resolved_spell.bind(self.options_snapshot)
+        self.collect_stats = instrumentation is not None
+        self.profile_mode = instrumentation.profile_mode if instrumentation else None
+        self.analyze = report is not None
+        self.modified_types = resolved_spell.modified_types
+        return resolved_spell, spell_function
+
+    def iter_input_files(self):
+        """
+        Yield the files to process from the input paths.
+
+        Directories are scanned lazily in sorted order, subdirectories are only entered
+        when include_subdirs is set, and the extension and name filters are applied
+        before a file is yielded. Files in archives opened by open_archives are
+        yielded as paths below the archive's path.
+        """
+        for file_path, _ in self.iter_input_entries():
+            yield file_path
+
+    def iter_input_entries(self):
+        """Like iter_input_files, but yield each path with its os.DirEntry, or None if it has none."""
+        for input_path in self.input_paths:
+            if input_path in self.archives:
+                members = (self.get_member_path(input_path, entry) for entry in self.archives[input_path].entries)
+                yield from ((member, None) for member in sorted(members) if self.accepts_file_name(member))
+                continue
+            if os.path.isfile(input_path):
+                if self.accepts_file_name(input_path):
+                    yield input_path, None
+                continue
+
+            dirs = [input_path] if os.path.isdir(input_path) else []
+            while dirs:
+                with os.scandir(dirs.pop()) as it:
+                    entries = sorted(it, key=lambda entry: entry.name)
+                subdirs = []
+                for entry in entries:
+                    if entry.is_dir():
+                        if self.include_subdirs and not entry.is_symlink():
+                            subdirs.append(entry.path)
+                    elif self.accepts_file_name(entry.path):
+                        yield entry.path, entry
+                dirs.extend(reversed(subdirs))
+
+    def accepts_file_name(self, file_path):
+        if not file_path.lower().endswith(self.extensions):
+            return False
+        return not self.filter_enabled or bool(self.filter_regex.search(file_path))
 
     def process_file(self, file_path, spell):
         from pynichon.utils.spell_manager import get_spell_manager
 
         if self.filter_enabled and not self.filter_regex.search(file_path):
+            return FileResult(file_path, status=FILTERED)
+        resolved_spell = get_spell_manager().resolve(spell)
+        resolved_spell.load()
+        options = resolved_spell.options_model().snapshot(self.spell_options)
+        return self.apply_spell(file_path, resolved_spell.bind(options))
+
+    def apply_spell(self, file_path, spell_function, stats=NULL_STATS, writer=None):
+        """
+        Load a file, run a resolved spell function on it and save the result.
+
+        When the spell returns False, the input is written out as it is. Otherwise
+        the blocks of the types the spell modifies are spliced into the input, or
+        the whole NIF is serialized, straight to disk for large files. With
+        only_modified set, unchanged files are not written. Timings are recorded in
+        stats, and a WriteBack writer, if given, writes the output. In analysis
+        mode, nothing is written and the spell's return value is kept as findings.
+        """
+        with self.open_input(file_path) as data:
+            stats.mark("read")
+            stats.count("bytes_read", len(data))
+            input_hash = None
+            if self.incremental:
+                input_hash = hashlib.sha1(data).hexdigest()
+                stats.mark("hash")
+
+            nif_data = NifFile.parse_nif(data, file_path)
+            stats.mark("parse")
+            if stats.enabled:
+                stats.count("blocks", len(getattr(nif_data, "blocks", ())))
+
+            modified = spell_function(nif_data)
+            stats.mark("spell")
+
+            if self.analyze:
+                result = FileResult(file_path, status=ANALYZED)
+                result.findings = collect_findings(modified)
+            elif modified is False:
+                if self.only_modified:
+                    result = FileResult(file_path, status=UNCHANGED)
+                else:
+                    result = self.pass_through_data(file_path, data, stats, writer)
+            else:
+                spliced = splice_nif(nif_data, data, self.modified_types) if self.modified_types else None
+                if spliced is not None:
+                    result = self.write_splice(file_path, spliced, stats, writer)
+                elif len(data) >= self.large_file_size:
+                    result = self.stream_output(file_path, nif_data, data, stats)
+                else:
+                    output_data = NifFile.to_bytes(nif_data)
+                    stats.mark("serialize")
+                    if self.only_modified and memoryview(data) == output_data:
+                        result = FileResult(file_path, status=UNCHANGED)
+                    else:
+                        result = self.write_output(file_path, output_data, stats, writer)
+        result.input_hash = input_hash
+        return result
+
+    def write_output(self, file_path, output_data, stats=NULL_STATS, writer=None):
+        output_path = self.get_output_path(file_path)
+        result = FileResult(file_path, output_path)
+        if writer:
+            result.pending_write = writer.submit(output_data, output_path)
+        else:
+            NifFile.write_bytes(output_data, output_path)
+        stats.mark("write")
+        stats.count("bytes_written", len(output_data))
+        return result
+
+    def pass_through_data(self, file_path, data, stats=NULL_STATS, writer=None):
+        """Write the input of a file the spell left unchanged as its output, without serializing it."""
+        stats.count("passed_through")
+        output_path = self.get_output_path(file_path)
+        if output_path == file_path:
+            return FileResult(file_path, output_path)
+        if self.get_input_root(file_path) in self.archive_outputs:
+            # Members not staged are copied into the output archive as stored.
+            return FileResult(file_path, output_path)
+        if not isinstance(data, bytes):
+            # A memory-mapped input is only valid until the file is closed.
+            writer = None
+        return self.write_output(file_path, data, stats, writer)
+
+    def write_splice(self, file_path, spliced, stats=NULL_STATS, writer=None):
+        """Write a spliced output, copying its unmodified blocks from the input."""
+        stats.mark("serialize")
+        stats.count("replaced_blocks", spliced.modified_blocks)
+        if self.only_modified and not spliced.modified_blocks:
+            return FileResult(file_path, status=UNCHANGED)
+        size = len(spliced)
+        if size < self.large_file_size:
+            return self.write_output(file_path, spliced.to_bytes(), stats, writer)
+
+        output_path = self.get_output_path(file_path)
+        NifFile.write_chunks(spliced.chunks(), output_path)
+        stats.mark("write")
+        stats.count("bytes_written", size)
+        return FileResult(file_path, output_path)
+
+    def stream_output(self, file_path, nif_data, data, stats=NULL_STATS):
+        """Serialize a large file straight into its output file."""
+        output_path = self.get_output_path(file_path)
+        written = NifFile.stream_nif(nif_data, output_path, data if self.only_modified else None)
+        stats.mark("write")
+        if not written:
+            return FileResult(file_path, status=UNCHANGED)
+        stats.count("bytes_written", os.path.getsize(output_path))
+        return FileResult(file_path, output_path)
+
+    def is_large_file(self, file_path):
+        """Check whether a file is at least large_file_size bytes, from the file system or its archive."""
+        member = self.archive_members.get(file_path)
+        if member:
+            entry = member[1]
+            return (entry.original_size or entry.size) >= self.large_file_size
+        try:
+            return os.path.getsize(file_path) >= self.large_file_size
+        except OSError:
+            return False
+
+    @contextmanager
+    def open_input(self, file_path):
+        """Provide the contents of an input file, from an archive or from disk."""
+        member = self.archive_members.get(file_path)
+        if member:
+            archive_path, entry = member
+            yield self.archives[archive_path].read(entry)
+        else:
+            # A file written in place is read into memory, so it is not mapped when it is replaced.
+            in_place = not self.analyze and self.get_output_path(file_path) == file_path
+            with NifFile.open_buffer(file_path, allow_mmap=not in_place) as data:
+                yield data
+
+    def open_archives(self):
+        """Read the index of every archive in the input paths, once per batch."""
+        self.close_archives()
+        try:
+            for input_path in self.input_paths:
+                if is_archive(input_path):
+                    self.open_input_archive(input_path)
+        except BaseException:
+            # Remove the staging directories of the archives opened before the failure.
+            self.close_archives()
+            raise
+
+    def open_input_archive(self, input_path):
+        archive = open_archive(input_path)
+        self.archives[input_path] = archive
+        for entry in archive.entries:
+            self.archive_members[self.get_member_path(input_path, entry)] = (input_path, entry)
+        if self.analyze:
+            # Analysis runs write nothing, so no output archive is staged.
             return
+        if self.pack_archives or not self.output_dir:
+            output_path = os.path.join(self.output_dir, os.path.basename(input_path)) \
+                if self.output_dir else input_path
+            os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+            staging_dir = tempfile.mkdtemp(prefix=".pynichon_", dir=os.path.dirname(output_path) or ".")
+            self.archive_outputs[input_path] = (output_path, staging_dir)
 
-        nif_data = NifFile.load_nif(file_path)
-        get_spell_manager().run_spell(nif_data, spell)
+    def write_archives(self):
+        """Write the output archives, with the meshes processed in this batch replaced."""
+        for archive_path, (output_path, staging_dir) in self.archive_outputs.items():
+            replacements = {}
+            for root, _, files in os.walk(staging_dir):
+                for file in files:
+                    file_path = os.path.join(root, file)
+                    replacements[normalize_name(os.path.relpath(file_path, staging_dir))] = file_path
+            if replacements or output_path != archive_path:
+                repack_archive(self.archives[archive_path], output_path, replacements)
 
-        output_path = file_path if not self.output_dir else os.path.join(
-            self.output_dir, os.path.relpath(file_path, self.input_paths[0]))
-        if self.rename_enabled and self.rename_regex:
-            new_name = self.rename_regex.sub('', os.path.basename(output_path))
-            output_path = os.path.join(os.path.dirname(output_path), new_name)
-        NifFile.save_nif(nif_data, output_path)
+    def close_archives(self):
+        for archive in self.archives.values():
+            archive.close()
+        for _, staging_dir in self.archive_outputs.values():
+            shutil.rmtree(staging_dir, ignore_errors=True)
+        self.archives = {}
+        self.archive_members = {}
+        self.archive_outputs = {}
+
+    def get_archive_output_path(self, staged_path):
+        """Return the path of a staged output below the path of its output archive."""
+        for output_path, staging_dir in self.archive_outputs.values():
+            if staged_path.startswith(staging_dir + os.sep):
+                return os.path.join(output_path, os.path.relpath(staged_path, staging_dir))
+        return staged_path
+
+    def get_member_path(self, archive_path, entry):
+        return os.path.join(archive_path, *entry.name.split("\\"))
+
+    def skip_current(self, file_paths, manifest):
+        """Replace files that are current in the manifest with up-to-date results."""
+        for file_path in file_paths:
+            if file_path in self.archive_members:
+                yield file_path
+            elif manifest.is_current(file_path, self.get_output_path(file_path)):
+                yield FileResult(file_path, status=UP_TO_DATE)
+            else:
+                yield file_path
+
+    def filter_by_header(self, file_paths, spell, header_index):
+        """Pass through the files the spell does not apply to, according to their header."""
+        for file_path in file_paths:
+            if isinstance(file_path, FileResult) or self.spell_applies(file_path, spell, header_index):
+                yield file_path
+            else:
+                yield self.pass_through(file_path)
+
+    def spell_applies(self, file_path, spell, header_index):
+        """Check a file's header against the spell's "Applies To" filter."""
+        try:
+            return spell.accepts(header_index.get(file_path))
+        except (NifError, OSError):
+            # Leave the error to be reported when the file is loaded.
+            return True
+
+    def pass_through(self, file_path):
+        """Copy a file the spell does not apply to, unless only modified files are output."""
+        output_path = self.get_output_path(file_path)
+        if self.only_modified or self.analyze or output_path == file_path or file_path in self.archive_members:
+            return FileResult(file_path, status=NOT_APPLICABLE)
+        try:
+            NifFile.copy_file(file_path, output_path)
+        except OSError as e:
+            return FileResult(file_path, status=FAILED, error=str(e))
+        return FileResult(file_path, output_path, status=NOT_APPLICABLE)
+
+    def run_file(self, file_path, spell_function, writer=None):
+        """Like apply_spell, but failures are returned as a FileResult instead of raised."""
+        stats = FileStats() if self.collect_stats else NULL_STATS
+        profiler = FileProfiler(self.profile_mode) if self.profile_mode else None
+        try:
+            result = self.apply_spell(file_path, spell_function, stats, writer)
+        except MemoryError:
+            result = FileResult(file_path, status=FAILED, error="Out of memory.")
+            stats.count("errors")
+        except Exception as e:
+            result = FileResult(file_path, status=FAILED, error=str(e))
+            stats.count("errors")
+        if profiler:
+            result.profile = profiler.finish()
+        if stats.enabled:
+            result.stats = stats
+        return result
+
+    def report_result(self, result):
+        if result.status == FAILED:
+            print(f"Error processing file {result.input_path}: {result.error}")
+            if self.skip_errors:
+                print("Skipping file due to error.")
 
     def get_spell_files(self, spells_dir):
         json_files = []
@@ -77,10 +465,43 @@ class IOManager:
             )
         return json_files
 
+    def get_manifest_path(self):
+        base_dir = self.output_dir or self.input_paths[0]
+        if os.path.isfile(base_dir):
+            base_dir = os.path.dirname(base_dir)
+        return os.path.join(base_dir, MANIFEST_NAME)
+
+    def get_spell_key(self, spell, resolved_spell):
+        """Identify a spell run for the manifest: spell name(s), source hash and options."""
+        return {
+            "name": list(spell) if isinstance(spell, (list, tuple)) else spell,
+            "hash": resolved_spell.source_hash,
+            "options": self.options_snapshot.key(),
+        }
+
+    def get_input_root(self, input_path):
+        """Return the input directory a file was found under, or its own directory for input files."""
+        for root in self.input_paths:
+            if not (os.path.isdir(root) or root in self.archives):
+                continue
+            try:
+                relative_path = os.path.relpath(input_path, root)
+            except ValueError:
+                # Different drive on Windows.
+                continue
+            if relative_path.split(os.sep)[0] != os.pardir:
+                return root
+        return os.path.dirname(input_path)
+
     def get_output_path(self, input_path):
-        output_path = input_path if not self.output_dir else os.path.join(
-            self.output_dir, os.path.relpath(input_path, self.input_paths[0])
-        )
+        input_root = self.get_input_root(input_path)
+        if input_root in self.archive_outputs:
+            # Staged until the output archive is written.
+            output_path = os.path.join(self.archive_outputs[input_root][1], os.path.relpath(input_path, input_root))
+        else:
+            output_path = input_path if not self.output_dir else os.path.join(
+                self.output_dir, os.path.relpath(input_path, input_root)
+            )
         if self.rename_enabled and self.rename_regex:
             new_name = self.rename_regex.sub("", os.path.basename(output_path))
             output_path = os.path.join(os.path.dirname(output_path), new_name)
@@ -0,0 +1,103 @@
+import hashlib
+import json
+import os
+
+MANIFEST_NAME = ".pynichon_manifest.jsonl"
+
+
+def file_digest(file_path):
+    """Return the SHA-1 hex digest of a file's contents."""
+    digest = hashlib.sha1()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Manifest:
+    """
+    Record of the inputs a spell has already been applied to.
+
+    The manifest is stored as JSON lines, one record per input file, holding the
+    input's size, mtime and hash along with the spell, spell source hash and option
+    values it was processed with. Records are appended as files complete and the
+    file is compacted on save, so an interrupted run keeps its progress.
+    """
+
+    def __init__(self, path, spell_key):
+        self.path = path
+        self.spell_key = spell_key
+        self.entries = {}
+        self.stream = None
+
+        if os.path.isfile(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        self.entries[entry["input"]] = entry
+                    except (KeyError, json.JSONDecodeError):
+                        continue
+
+    def is_current(self, input_path, output_path):
+        """Return whether the input was processed with the same spell and is unchanged since."""
+        entry = self.entries.get(os.path.abspath(input_path))
+        if entry is None or entry["spell"] != self.spell_key:
+            return False
+        if entry["output"] and (entry["output"] != output_path or not os.path.exists(output_path)):
+            return False
+
+        stat = os.stat(input_path)
+        if stat.st_size != entry["size"]:
+            return False
+        if stat.st_mtime_ns != entry["mtime"]:
+            # Touched but possibly unchanged; fall back to comparing contents.
+            if file_digest(input_path) != entry["hash"]:
+                return False
+            entry["mtime"] = stat.st_mtime_ns
+        return True
+
+    def record(self, input_path, output_path, input_hash=None):
+        """Record a processed input, or re-hash it if the spell wrote to it in place."""
+        if input_hash is None or output_path == input_path:
+            input_hash = file_digest(input_path)
+        stat = os.stat(input_path)
+        entry = {
+            "input": os.path.abspath(input_path),
+            "output": output_path,
+            "size": stat.st_size,
+            "mtime": stat.st_mtime_ns,
+            "hash": input_hash,
+            "spell": self.spell_key,
+        }
+        self.entries[entry["input"]] = entry
+
+        if self.stream is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self.stream = open(self.path, "a", encoding="utf-8")
+        self.stream.write(json.dumps(entry) + "\n")
+        self.stream.flush()
+
+    def update(self, result):
+        """Update the manifest from a FileResult."""
+        from pynichon.io.batch import PROCESSED, UNCHANGED, NOT_APPLICABLE, UP_TO_DATE
+
+        if result.status in (PROCESSED, UNCHANGED, NOT_APPLICABLE):
+            self.record(result.input_path, result.output_path, result.input_hash)
+        elif result.status != UP_TO_DATE:
+            self.discard(result.input_path)
+
+    def discard(self, input_path):
+        self.entries.pop(os.path.abspath(input_path), None)
+
+    def save(self):
+        """Rewrite the manifest with one record per input."""
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            for entry in self.entries.values():
+                f.write(json.dumps(entry) + "\n")
+        os.replace(temp_path, self.path)
@@ -0,0 +1,203 @@
+"""This module reads NIF headers without parsing block data."""
+
+import json
+import os
+import struct
+
+from pynichon.io.nif_io import NifError
+
+
+def version_from_string(version_string):
+    """Convert a dotted version such as "20.2.0.7" to its integer form."""
+    parts = [int(part) for part in version_string.strip().split(".")]
+    parts += [0] * (4 - len(parts))
+    return (parts[0] << 24) | (parts[1] << 16) | (parts[2] << 8) | parts[3]
+
+
+def version_to_string(version):
+    return ".".join(str((version >> shift) & 0xFF) for shift in (24, 16, 8, 0))
+
+
+class NifHeader:
+    """Version and block type information of a NIF file."""
+
+    def __init__(self, version, user_version=0, bs_version=0, block_types=None,
+                 block_type_index=None, block_sizes=None, strings=None, data_offset=None,
+                 block_sizes_offset=None, endian="<"):
+        self.version = version
+        self.user_version = user_version
+        self.bs_version = bs_version
+        self.block_types = block_types
+        self.block_type_index = block_type_index
+        self.block_sizes = block_sizes
+        self.strings = strings
+        self.data_offset = data_offset
+        self.block_sizes_offset = block_sizes_offset
+        self.endian = endian
+
+    @property
+    def num_blocks(self):
+        return len(self.block_type_index) if self.block_type_index is not None else None
+
+    def block_type_names(self):
+        """Return the set of block types used in the file, or None if the header does not list them."""
+        if self.block_types is None:
+            return None
+        return {self.block_types[index] for index in self.block_type_index}
+
+    def to_dict(self):
+        return dict(self.__dict__)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+
+class _Reader:
+    def __init__(self, stream):
+        self.stream = stream
+        self.endian = "<"
+
+    def read(self, size):
+        data = self.stream.read(size)
+        if len(data) != size:
+            raise NifError("Unexpected end of NIF header.")
+        return data
+
+    def unpack(self, fmt, endian=None):
+        fmt = (endian or self.endian) + fmt
+        return struct.unpack(fmt, self.read(struct.calcsize(fmt)))
+
+    def uint(self, endian=None):
+        return self.unpack("I", endian)[0]
+
+    def ushort(self):
+        return self.unpack("H")[0]
+
+    def sized_string(self):
+        return self.read(self.uint()).decode("latin-1")
+
+    def export_string(self):
+        return self.read(self.unpack("B")[0]).rstrip(b"\x00").decode("latin-1")
+
+
+def read_header(stream):
+    """
+    Read a NIF header from a binary stream positioned at the start of the file.
+
+    Raises NifError if the stream is not a NIF file. For versions that predate the
+    block type table, only the version is filled in.
+    """
+    # The version line is found in a bounded read rather than with readline, which
+    # memory maps do not limit.
+    start = stream.tell()
+    line, newline, _ = stream.read(256).partition(b"\n")
+    if not newline or b"Version " not in line:
+        raise NifError("Not a NIF file.")
+    stream.seek(start + len(line) + 1)
+    try:
+        version = version_from_string(line.rsplit(b"Version ", 1)[1].decode("ascii"))
+    except (ValueError, UnicodeDecodeError):
+        raise NifError("Not a NIF file.")
+    if version < 0x03010001:
+        return NifHeader(version)
+
+    reader = _Reader(stream)
+    version = reader.uint("<")
+    if version >= 0x14000003 and reader.unpack("B")[0] == 0:
+        reader.endian = ">"
+    user_version = reader.uint() if version >= 0x0A000108 else 0
+    num_blocks = reader.uint()
+
+    bs_version = 0
+    if version == 0x0A000102 or (
+            (version in (0x14020007, 0x14000005) or (0x0A010000 <= version <= 0x14000004 and user_version <= 11))
+            and user_version >= 3):
+        bs_version = reader.uint("<")
+        reader.export_string()  # author
+        if bs_version > 130:
+            reader.uint()
+        if bs_version < 131:
+            reader.export_string()  # process script
+        reader.export_string()  # export script
+        if bs_version >= 103:
+            reader.export_string()  # max filepath
+
+    if version >= 0x1E000000:
+        reader.read(reader.uint())  # metadata
+
+    header = NifHeader(version, user_version, bs_version, endian=reader.endian)
+    if version < 0x05000001 or version == 0x14030102:
+        # No block type names in the header (or only their hashes).
+        return header
+
+    num_block_types = reader.ushort()
+    header.block_types = [reader.sized_string() for _ in range(num_block_types)]
+    header.block_type_index = [index & 0x7FFF for index in reader.unpack(f"{num_blocks}H")]
+    if version >= 0x14020005:
+        header.block_sizes_offset = stream.tell()
+        header.block_sizes = list(reader.unpack(f"{num_blocks}I"))
+    if version >= 0x14010001:
+        num_strings = reader.uint()
+        reader.uint()  # max string length
+        header.strings = [reader.sized_string() for _ in range(num_strings)]
+    if version >= 0x05000006:
+        reader.read(4 * reader.uint())  # groups
+    header.data_offset = stream.tell()
+    return header
+
+
+def scan_header(file_path):
+    with open(file_path, "rb") as stream:
+        return read_header(stream)
+
+
+class HeaderIndex:
+    """
+    Cache of scanned NIF headers keyed on file path and validated by size and mtime.
+
+    If a path is given, the index is loaded from and saved to a JSON lines file so
+    later runs can reject files without reading them at all.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.entries = {}
+        self.dirty = False
+
+        if path and os.path.isfile(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        self.entries[entry["path"]] = entry
+                    except (KeyError, json.JSONDecodeError):
+                        continue
+
+    def get(self, file_path):
+        """Return the header of a file, scanning it only if it changed since it was indexed."""
+        key = os.path.abspath(file_path)
+        stat = os.stat(file_path)
+        entry = self.entries.get(key)
+        if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime_ns:
+            return NifHeader.from_dict(entry["header"])
+
+        header = scan_header(file_path)
+        # The string table is not needed for filtering, so it is not indexed.
+        header.strings = None
+        self.entries[key] = {
+            "path": key, "size": stat.st_size, "mtime": stat.st_mtime_ns, "header": header.to_dict()
+        }
+        self.dirty = True
+        return header
+
+    def save(self):
+        if not self.path or not self.dirty:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            for entry in self.entries.values():
+                f.write(json.dumps(entry) + "\n")
+        os.replace(temp_path, self.path)
+        self.dirty = False
@@ -37,12 +37,37 @@
 #
 # ***** END LICENSE BLOCK *****
 
-from pyffi.formats.nif import NifFormat
-
+import io
+import logging
+import mmap
 import os
 import os.path as path
+import shutil
+import uuid
+from contextlib import contextmanager
+
+NifLog = logging.getLogger("pynichon")
+
+_nif_format = None
+
+# Files at least this large are memory-mapped instead of read into memory.
+MMAP_THRESHOLD = 32 << 20
+
+# Size of the chunks a streamed output is read back in to compare it with its input.
+COMPARE_CHUNK_SIZE = 1 << 20
+
 
-import nifgen.formats.nif as NifFormat
+def get_nif_format():
+    """Import the nifgen NIF format definitions on first use, since loading them is slow."""
+    global _nif_format
+    if _nif_format is None:
+        import nifgen.formats.nif as NifFormat
+        _nif_format = NifFormat
+    return _nif_format
+
+
+class NifError(Exception):
+    """Raised when a NIF cannot be read or written."""
 
 
 class NifFile:
@@ -51,35 +76,164 @@ class NifFile:
     @staticmethod
     def load_nif(file_path):
         """Loads a NIF from the given file path."""
+        with NifFile.open_buffer(file_path) as data:
+            return NifFile.parse_nif(data, file_path)
+
+    @staticmethod
+    def read_file(file_path):
+        """Reads the raw contents of a NIF file."""
         NifLog.info(f"Importing {file_path}")
 
-        file_ext = path.splitext(file_path)[1]
+        # Unbuffered, so the whole file is read with a single buffer sized from its stat.
+        with open(file_path, "rb", buffering=0) as nif_stream:
+            return nif_stream.readall()
 
-        # open file for binary reading
+    @staticmethod
+    @contextmanager
+    def open_buffer(file_path, allow_mmap=True):
+        """
+        Provides the raw contents of a NIF file as a single buffer.
+
+        Large files are memory-mapped read-only, unless allow_mmap is False, and
+        others are read into memory. A mapped buffer is only valid inside the with
+        block, and the file cannot be replaced while it is mapped on Windows.
+        """
+        if not allow_mmap or os.path.getsize(file_path) < MMAP_THRESHOLD:
+            yield NifFile.read_file(file_path)
+            return
+
+        NifLog.info(f"Importing {file_path}")
         with open(file_path, "rb") as nif_stream:
-            # check if nif file is valid
-            modification, (version, user_version, bs_version) = NifFormat.NifFile.inspect_version_only(nif_stream)
-            if version >= 0:
-                # it is valid, so read the file
-                NifLog.info(f"NIF file version: {version:x}")
-                NifLog.info(f"Reading {file_ext} file")
-                nif_data = NifFormat.NifFile.from_stream(nif_stream)
-            elif version == -1:
-                raise NifError("Unsupported NIF version.")
-            else:
-                raise NifError("Not a NIF file.")
-
-        return nif_data
+            with mmap.mmap(nif_stream.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                yield data
+
+    @staticmethod
+    def read_nif(nif_stream, file_path=""):
+        """Reads a NIF from a binary stream."""
+        file_ext = path.splitext(file_path)[1]
+        NifFormat = get_nif_format()
+
+        # check if nif file is valid
+        modification, (version, user_version, bs_version) = NifFormat.NifFile.inspect_version_only(nif_stream)
+        if version >= 0:
+            # it is valid, so read the file
+            NifLog.info(f"NIF file version: {version:x}")
+            NifLog.info(f"Reading {file_ext} file")
+            return NifFormat.NifFile.from_stream(nif_stream)
+        elif version == -1:
+            raise NifError("Unsupported NIF version.")
+        else:
+            raise NifError("Not a NIF file.")
+
+    @staticmethod
+    def parse_nif(data, file_path=""):
+        """Parses a NIF from its raw contents, as bytes or a memory map."""
+        if isinstance(data, mmap.mmap):
+            # A memory map is a file-like object itself, so it is parsed without copying.
+            data.seek(0)
+            return NifFile.read_nif(data, file_path)
+        return NifFile.read_nif(io.BytesIO(data), file_path)
 
     @staticmethod
     def save_nif(nif_data, file_path):
         """Saves a NIF at the given file path."""
+        NifFile.write_bytes(NifFile.to_bytes(nif_data), file_path)
+
+    @staticmethod
+    def to_bytes(nif_data):
+        """Serializes a NIF into memory."""
+        out_stream = io.BytesIO()
+        try:
+            nif_data.write(out_stream)
+        except Exception as e:
+            raise NifError(str(e))
+        return out_stream.getvalue()
+
+    @staticmethod
+    def copy_file(source_path, file_path):
+        """Copies a file to the given file path, replacing it atomically like write_bytes."""
         NifLog.info(f"Exporting {file_path}")
 
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+        temp_path = f"{file_path}.{uuid.uuid4().hex[:8]}.tmp"
+        try:
+            shutil.copyfile(source_path, temp_path)
+            os.replace(temp_path, file_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
 
+    @staticmethod
+    def stream_nif(nif_data, file_path, original=None):
+        """
+        Serializes a NIF straight into a file at the given path, so the output is
+        never held in memory.
+
+        The file is replaced atomically like with write_bytes. If the original data
+        is given and the output is identical to it, the file is left alone and False
+        is returned.
+        """
+        NifLog.info(f"Exporting {file_path}")
+
+        os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+        temp_path = f"{file_path}.{uuid.uuid4().hex[:8]}.tmp"
         try:
-            with open(file_path, 'wb') as out_file:
-                nif_data.write(out_file)
-        except Exception as e:
-            raise NifError(str(e))
\ No newline at end of file
+            with open(temp_path, "xb+") as out_file:
+                try:
+                    nif_data.write(out_file)
+                except Exception as e:
+                    raise NifError(str(e))
+                identical = original is not None and NifFile.stream_equals(out_file, original)
+            if identical:
+                os.remove(temp_path)
+                return False
+            os.replace(temp_path, file_path)
+            return True
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    @staticmethod
+    def stream_equals(stream, data):
+        """Compares the contents of a binary stream with data, a chunk at a time."""
+        size = stream.seek(0, io.SEEK_END)
+        if size != len(data):
+            return False
+        stream.seek(0)
+        with memoryview(data) as view:
+            offset = 0
+            while offset < size:
+                chunk = stream.read(COMPARE_CHUNK_SIZE)
+                if not chunk or view[offset:offset + len(chunk)] != chunk:
+                    return False
+                offset += len(chunk)
+        return True
+
+    @staticmethod
+    def write_bytes(data, file_path):
+        """
+        Writes serialized NIF data, as bytes or a memory map, at the given file path.
+
+        The data is written to a temporary file next to the target in one write, and
+        then renamed over it, so the target is never left partially written.
+        """
+        NifFile.write_chunks((data,), file_path)
+
+    @staticmethod
+    def write_chunks(chunks, file_path):
+        """Writes serialized NIF data given as a sequence of buffers, like write_bytes."""
+        NifLog.info(f"Exporting {file_path}")
+
+        os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+        temp_path = f"{file_path}.{uuid.uuid4().hex[:8]}.tmp"
+        try:
+            with open(temp_path, "xb") as out_file:
+                for chunk in chunks:
+                    out_file.write(chunk)
+            os.replace(temp_path, file_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
@@ -0,0 +1,122 @@
+"""Writing a NIF by splicing the blocks a spell modified into the bytes of its input."""
+
+import io
+import mmap
+import struct
+
+from pynichon.io.nif_header import read_header
+from pynichon.io.nif_io import NifError
+
+# Unmodified byte ranges are copied from the input in chunks of at most this size.
+COPY_CHUNK_SIZE = 1 << 20
+
+
+def block_to_bytes(nif_data, block):
+    """Serialize a single block of a NIF, in the context of the NIF it belongs to."""
+    stream = io.BytesIO()
+    type(block).to_stream(block, stream, nif_data)
+    return stream.getvalue()
+
+
+class NifSplice:
+    """
+    The output of a NIF, as byte ranges of its input with some blocks replaced.
+
+    Only the header and the replaced blocks are held in memory; the rest is copied
+    from the input as the chunks are written, so the input must stay open until then.
+    """
+
+    def __init__(self, data, header_data, block_ranges, replacements, footer_offset):
+        self.data = data
+        self.header_data = header_data
+        self.block_ranges = block_ranges
+        self.replacements = replacements
+        self.footer_offset = footer_offset
+
+    @property
+    def modified_blocks(self):
+        return len(self.replacements)
+
+    def __len__(self):
+        size = len(self.header_data) + len(self.data) - self.footer_offset
+        for index, (start, end) in enumerate(self.block_ranges):
+            replacement = self.replacements.get(index)
+            size += len(replacement) if replacement is not None else end - start
+        return size
+
+    def chunks(self):
+        """Yield the output a chunk at a time."""
+        yield self.header_data
+        copy_start = copy_end = None
+        for index, (start, end) in enumerate(self.block_ranges):
+            replacement = self.replacements.get(index)
+            if replacement is None:
+                # Consecutive unmodified blocks are copied as one range.
+                if copy_start is None:
+                    copy_start = start
+                copy_end = end
+                continue
+            if copy_start is not None:
+                yield from self._copy(copy_start, copy_end)
+                copy_start = None
+            yield replacement
+        if copy_start is not None:
+            yield from self._copy(copy_start, copy_end)
+        yield from self._copy(self.footer_offset, len(self.data))
+
+    def _copy(self, start, end):
+        for offset in range(start, end, COPY_CHUNK_SIZE):
+            yield self.data[offset:min(offset + COPY_CHUNK_SIZE, end)]
+
+    def to_bytes(self):
+        return b"".join(self.chunks())
+
+
+def splice_nif(nif_data, data, block_types):
+    """
+    Return a NifSplice of a NIF whose blocks of the given types may have changed, or
+    None if the file cannot be spliced and must be serialized whole.
+
+    Splicing needs the block sizes in the header, which NIFs list from version
+    20.2.0.5 on, and the blocks to be the same as in the input apart from the
+    contents of blocks of the given types. Those blocks are serialized one by one
+    and only kept where they differ from the input, with their new sizes patched
+    into the header.
+    """
+    if isinstance(data, mmap.mmap):
+        data.seek(0)
+        stream = data
+    else:
+        stream = io.BytesIO(data)
+    try:
+        header = read_header(stream)
+    except NifError:
+        return None
+    blocks = list(getattr(nif_data, "blocks", None) or ())
+    if header.block_sizes is None or len(blocks) != len(header.block_sizes):
+        return None
+
+    block_ranges = []
+    offset = header.data_offset
+    for size in header.block_sizes:
+        block_ranges.append((offset, offset + size))
+        offset += size
+    if offset > len(data):
+        return None
+
+    block_types = set(block_types)
+    replacements = {}
+    header_data = bytearray(data[:header.data_offset])
+    for index, block in enumerate(blocks):
+        if block_types.isdisjoint(cls.__name__ for cls in type(block).__mro__):
+            continue
+        try:
+            block_data = block_to_bytes(nif_data, block)
+        except Exception:
+            return None
+        start, end = block_ranges[index]
+        if data[start:end] == block_data:
+            continue
+        replacements[index] = block_data
+        struct.pack_into(f"{header.endian}I", header_data, header.block_sizes_offset + 4 * index, len(block_data))
+    return NifSplice(data, bytes(header_data), block_ranges, replacements, offset)
@@ -0,0 +1,109 @@
+"""Findings reported by spells run in analysis mode, and where they are written."""
+
+import csv
+import json
+import os
+from collections import Counter
+
+
+def collect_findings(value):
+    """
+    Return the findings a spell returned as a list of dicts.
+
+    Analysis spells return a dict per finding, a list of them, or nothing (None or
+    False) when the file has no findings.
+    """
+    if value is None or isinstance(value, bool):
+        return []
+    if isinstance(value, dict):
+        return [dict(value)]
+    return [dict(finding) for finding in value]
+
+
+class JsonLinesReport:
+    """Writes one JSON record per finding as files complete."""
+
+    def __init__(self, stream, close_stream=False):
+        self.stream = stream
+        self.close_stream = close_stream
+
+    @classmethod
+    def open(cls, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        return cls(open(path, "w", encoding="utf-8"), close_stream=True)
+
+    def record(self, result, findings):
+        for finding in findings:
+            self.stream.write(json.dumps({"file": result.input_path, **finding}, default=str) + "\n")
+        self.stream.flush()
+
+    def close(self):
+        if self.close_stream:
+            self.stream.close()
+
+
+class CsvReport:
+    """
+    Writes one CSV row per finding as files complete.
+
+    The columns are taken from the first finding; fields only later findings have
+    are kept as JSON in a final "extra" column.
+    """
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.stream = open(path, "w", newline="", encoding="utf-8")
+        self.writer = csv.writer(self.stream)
+        self.columns = None
+
+    def record(self, result, findings):
+        for finding in findings:
+            if self.columns is None:
+                self.columns = list(finding)
+                self.writer.writerow(["file"] + self.columns + ["extra"])
+            extra = {key: value for key, value in finding.items() if key not in self.columns}
+            self.writer.writerow(
+                [result.input_path] + [finding.get(column, "") for column in self.columns]
+                + [json.dumps(extra, default=str) if extra else ""])
+        self.stream.flush()
+
+    def close(self):
+        self.stream.close()
+
+
+class AnalysisReport:
+    """
+    Collects the findings of an analysis run and streams them to outputs.
+
+    Pass an instance to IOManager.process_files to run the spell read-only: its
+    return value is taken as findings, and no file is serialized or written.
+    Findings are counted by their "type" field, if they have one.
+    """
+
+    def __init__(self, outputs=None):
+        self.outputs = list(outputs or [])
+        self.files = 0
+        self.files_with_findings = 0
+        self.findings = 0
+        self.counts = Counter()
+
+    def record(self, result):
+        self.files += 1
+        findings = result.findings or []
+        if not findings:
+            return
+        self.files_with_findings += 1
+        self.findings += len(findings)
+        self.counts.update(str(finding.get("type", "finding")) for finding in findings)
+        for output in self.outputs:
+            output.record(result, findings)
+
+    def close(self):
+        for output in self.outputs:
+            output.close()
+
+    def summary(self):
+        """Return a short text summary of the findings."""
+        lines = [f"{self.findings} findings in {self.files_with_findings} of {self.files} files"]
+        lines += [f"  {finding_type}: {count}" for finding_type, count in self.counts.most_common()]
+        return "\n".join(lines)
@@ -0,0 +1,271 @@
+"""Watching the input paths and reprocessing files as they change."""
+
+import asyncio
+import os
+import threading
+import time
+
+from pynichon.io.batch import _init_worker, _process_in_worker
+from pynichon.io.nif_header import HeaderIndex
+from pynichon.io.nif_io import get_nif_format
+
+
+# When polling, the time between scans is at least this many times the time a scan takes.
+SCAN_LOAD_FACTOR = 4
+
+# watchdog events that do not change a file.
+IGNORED_EVENTS = {"opened", "closed_no_write"}
+
+
+def _warm_up():
+    """Does nothing, so a worker process is started and initialized ahead of the first change."""
+
+
+class _EventHandler:
+    """Passes watchdog events on to a Watcher."""
+
+    def __init__(self, watcher):
+        self.watcher = watcher
+
+    def dispatch(self, event):
+        self.watcher.notify(event)
+
+
+class Watcher:
+    """
+    Reapplies a spell to the input files of an IOManager whenever they change.
+
+    If watchdog is installed, the input paths are watched with OS change
+    notifications, and only the files they report are checked every interval
+    seconds on an asyncio event loop. Otherwise, the input paths are polled, with
+    scans spaced further apart as they get slower on larger trees. A changed file
+    is processed once it has stayed the same for debounce seconds,
+    so a file still being exported is not picked up half written. Files are handed
+    to a pool of worker processes (or to a single thread with one worker), which is
+    started and loaded with the spell and the NIF format once, and kept for every
+    change after.
+
+    Outputs written by the watcher are not taken as changes, even when they are
+    written in place or below the input paths. Archives are not watched.
+    """
+
+    def __init__(self, io_manager, spell, interval=0.2, debounce=0.3, callback=None, report=None):
+        self.io_manager = io_manager
+        self.spell = spell
+        self.interval = interval
+        self.debounce = debounce
+        self.callback = callback
+        self.report = report
+        self.resolved_spell = None
+        self.spell_function = None
+        self.header_index = None
+        self.executor = None
+        self.known = {}
+        self.changed = {}
+        self.written = {}
+        self.in_flight = {}
+        self.processed = 0
+        self.observer = None
+        self.lock = threading.Lock()
+        self.notified = set()
+        self.rescan = False
+        self.scan_time = 0.0
+
+    def start(self):
+        """Load the spell and start the workers, so the first change is processed without delay."""
+        from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+        io_manager = self.io_manager
+        self.resolved_spell, self.spell_function = io_manager.prepare_run(self.spell, report=self.report)
+        io_manager.close_archives()
+        if self.resolved_spell.has_filter:
+            self.header_index = HeaderIndex(io_manager.header_index_path or None)
+
+        if io_manager.workers > 1:
+            self.executor = ProcessPoolExecutor(max_workers=io_manager.workers, initializer=_init_worker,
+                                                initargs=(io_manager, self.spell, io_manager.memory_limit))
+            for _ in range(io_manager.workers):
+                self.executor.submit(_warm_up)
+        else:
+            # A single thread, so spells never run concurrently with themselves.
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pynichon-watch")
+            get_nif_format()
+        self.observer = self.start_observer()
+        self.known = self.scan()
+
+    def start_observer(self):
+        """Watch the input paths with OS change notifications, if watchdog is installed."""
+        try:
+            from watchdog.observers import Observer
+        except ImportError:
+            return None
+
+        observer = Observer()
+        handler = _EventHandler(self)
+        for input_path in self.io_manager.input_paths:
+            if os.path.isdir(input_path):
+                observer.schedule(handler, input_path, recursive=self.io_manager.include_subdirs)
+            elif os.path.isfile(input_path):
+                observer.schedule(handler, os.path.dirname(input_path) or ".", recursive=False)
+        observer.start()
+        return observer
+
+    def notify(self, event):
+        """Record the files a watchdog event reports, on the observer's thread."""
+        if event.event_type in IGNORED_EVENTS:
+            return
+        with self.lock:
+            if event.is_directory:
+                # Files moved in or out with a directory are not reported one by one.
+                if event.event_type != "modified":
+                    self.rescan = True
+                return
+            for path in (event.src_path, getattr(event, "dest_path", None)):
+                if path:
+                    self.notified.add(os.fsdecode(path))
+
+    def close(self):
+        if self.observer:
+            self.observer.stop()
+            self.observer.join()
+            self.observer = None
+        if self.executor:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+        if self.header_index:
+            self.header_index.save()
+        if self.report:
+            self.report.close()
+
+    def is_output(self, file_path):
+        output_dir = self.io_manager.output_dir
+        return bool(output_dir) and os.path.abspath(file_path).startswith(os.path.abspath(output_dir) + os.sep)
+
+    def scan(self):
+        """Return the modification time and size of every input file, by path."""
+        start_time = time.perf_counter()
+        state = {}
+        for file_path, entry in self.io_manager.iter_input_entries():
+            if self.is_output(file_path):
+                continue
+            try:
+                # The stat of a directory entry is cached, or comes from the listing on Windows.
+                stat = entry.stat() if entry else os.stat(file_path)
+            except OSError:
+                continue
+            state[file_path] = (stat.st_mtime_ns, stat.st_size)
+        self.scan_time = time.perf_counter() - start_time
+        return state
+
+    def input_path_of(self, path):
+        """Return a reported path as iter_input_files yields it, or None if it is not an input."""
+        io_manager = self.io_manager
+        for input_path in io_manager.input_paths:
+            if os.path.isdir(input_path):
+                try:
+                    relative_path = os.path.relpath(path, input_path)
+                except ValueError:
+                    # On another drive.
+                    continue
+                if relative_path.startswith(os.pardir) or (os.sep in relative_path and not io_manager.include_subdirs):
+                    continue
+                path = os.path.join(input_path, relative_path)
+            elif os.path.normpath(path) == os.path.normpath(input_path):
+                path = input_path
+            else:
+                continue
+            if io_manager.accepts_file_name(path) and not self.is_output(path):
+                return path
+        return None
+
+    def poll(self):
+        """Return the state of the files that may have changed, and the paths that were checked."""
+        with self.lock:
+            notified, self.notified = self.notified, set()
+            rescan, self.rescan = self.rescan, False
+        if self.observer is None or rescan:
+            state = self.scan()
+            return state, set(self.known) | set(state)
+
+        paths = {self.input_path_of(path) for path in notified} - {None}
+        paths.update(self.changed)
+        state = {}
+        for file_path in paths:
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                continue
+            state[file_path] = (stat.st_mtime_ns, stat.st_size)
+        return state, paths
+
+    def delay(self):
+        if self.observer is not None:
+            return self.interval
+        return max(self.interval, SCAN_LOAD_FACTOR * self.scan_time)
+
+    async def run(self, stop=None):
+        """Watch the input paths until the stop event is set or the task is cancelled."""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.start)
+        try:
+            while not (stop and stop.is_set()):
+                await asyncio.sleep(self.delay())
+                current, checked = await loop.run_in_executor(None, self.poll)
+                for file_path in self.find_settled(current, checked, loop.time()):
+                    task = asyncio.ensure_future(self.process(file_path))
+                    self.in_flight[file_path] = task
+                    task.add_done_callback(lambda _, file_path=file_path: self.in_flight.pop(file_path, None))
+            if self.in_flight:
+                await asyncio.gather(*self.in_flight.values())
+        finally:
+            for task in self.in_flight.values():
+                task.cancel()
+            await loop.run_in_executor(None, self.close)
+
+    def find_settled(self, current, checked, now):
+        """Track changes between polls, and return the changed files that have settled."""
+        for file_path in checked - set(current):
+            self.known.pop(file_path, None)
+            self.changed.pop(file_path, None)
+        for file_path, signature in current.items():
+            if self.known.get(file_path) == signature:
+                continue
+            if self.changed.get(file_path, (None,))[0] != signature:
+                self.changed[file_path] = (signature, now)
+
+        settled = []
+        for file_path, (signature, changed_at) in list(self.changed.items()):
+            if self.written.get(file_path) == signature:
+                # The watcher's own output, written in place.
+                self.known[file_path] = signature
+                del self.changed[file_path]
+            elif now - changed_at >= self.debounce and file_path not in self.in_flight:
+                self.known[file_path] = signature
+                del self.changed[file_path]
+                settled.append(file_path)
+        return settled
+
+    async def process(self, file_path):
+        """Process a changed file on the workers, and report its result."""
+        loop = asyncio.get_running_loop()
+        io_manager = self.io_manager
+        if self.header_index and not io_manager.spell_applies(file_path, self.resolved_spell, self.header_index):
+            result = await loop.run_in_executor(None, io_manager.pass_through, file_path)
+        elif io_manager.workers > 1:
+            result = await loop.run_in_executor(self.executor, _process_in_worker, file_path)
+        else:
+            result = await loop.run_in_executor(self.executor, io_manager.run_file, file_path, self.spell_function)
+
+        self.processed += 1
+        if result.output_path:
+            try:
+                stat = os.stat(result.output_path)
+                self.written[result.output_path] = (stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                pass
+        io_manager.report_result(result)
+        if self.report:
+            self.report.record(result)
+        if self.callback:
+            self.callback(result)
+        return result
@@ -0,0 +1,377 @@
+"""
+NumPy views of mesh data, and vectorized operations on them for spells.
+
+Spells reach these through NifQuery.geometry(), which wraps each geometry data
+block of a NIF in a MeshArrays:
+
+    def fix_normals(nif_data, query):
+        for mesh in query.geometry():
+            mesh.normals = compute_normals(mesh.vertices, mesh.triangles)
+            mesh.recompute_tangents()
+            mesh.commit()
+"""
+
+import copy
+
+import numpy as np
+from numpy.lib.recfunctions import structured_to_unstructured
+
+# Array name: (field of NiGeometryData, field of BSVertexData, components)
+VERTEX_FIELDS = {
+    "vertices": ("vertices", "vertex", ("x", "y", "z")),
+    "normals": ("normals", "normal", ("x", "y", "z")),
+    "tangents": ("tangents", "tangent", ("x", "y", "z")),
+    "bitangents": ("bitangents", None, ("x", "y", "z")),
+    "uvs": ("uv_sets", "uv", ("u", "v")),
+    "colors": ("vertex_colors", "vertex_colors", ("r", "g", "b", "a")),
+}
+
+TRIANGLE_COMPONENTS = [("v_1", "v_2", "v_3"), ("v1", "v2", "v3")]
+
+# Block types holding geometry, for NifQuery.of_type.
+GEOMETRY_TYPES = ["NiGeometryData", "BSTriShape"]
+
+# Fields linking a shape to its skin, whose data indexes the shape's vertices.
+SKIN_FIELDS = ("skin_instance", "skin")
+
+# Bytes per triangle in the data size of a BSTriShape.
+TRIANGLE_SIZE = 6
+
+
+def _read_items(items, components, dtype):
+    """Return items as an (N, len(components)) array, and whether it is a view of them."""
+    if isinstance(items, np.ndarray) and items.dtype.names:
+        return structured_to_unstructured(items[list(components)], dtype=dtype), False
+    if isinstance(items, np.ndarray) and items.dtype != object:
+        return items.reshape(len(items), -1), True
+    rows = [[getattr(item, component) for component in components] for item in items]
+    return np.array(rows, dtype=dtype).reshape(len(rows), len(components)), False
+
+
+def _write_items(items, components, array):
+    if isinstance(items, np.ndarray) and items.dtype.names:
+        for column, component in enumerate(components):
+            items[component] = array[:, column]
+        return
+    if isinstance(items, np.ndarray) and items.dtype != object:
+        items[...] = array.reshape(items.shape)
+        return
+    for item, row in zip(items, array.tolist()):
+        for component, value in zip(components, row):
+            setattr(item, component, value)
+
+
+def _resized(items, count):
+    """Return items cut or extended to count, extending with copies of the last item."""
+    if isinstance(items, np.ndarray):
+        return np.resize(items, (count,) + items.shape[1:])
+    if count > len(items) and not len(items):
+        raise ValueError("Cannot add items to an empty array.")
+    return list(items[:count]) + [copy.copy(items[-1]) for _ in range(count - len(items))]
+
+
+def _select(items, indices):
+    if isinstance(items, np.ndarray):
+        return items[indices]
+    return [items[i] for i in indices.tolist()]
+
+
+class MeshArrays:
+    """
+    Per-vertex arrays and triangles of one geometry block as NumPy arrays.
+
+    Arrays are read on first access: fields nifgen already stores as NumPy arrays
+    are viewed without copying, others are gathered once from their structs.
+    Arrays assigned back (mesh.normals = ..., or mesh.vertices *= 2) are written
+    to the block in bulk by commit(); changes made through an index, such as
+    mesh.vertices[0] = ..., only reach fields that are viewed. Handles
+    NiGeometryData (and derived) blocks, and BSTriShape blocks with their
+    interleaved vertex data. The NifQuery of the NIF, if given, is used to find
+    the shapes using a data block.
+    """
+
+    def __init__(self, block, query=None):
+        self.block = block
+        self.query = query
+        self.interleaved = hasattr(block, "vertex_data")
+        self.arrays = {}
+        self.changed = set()
+        self.keep = None
+
+    def _source(self, name):
+        """Return the structs or array a vertex array is read from, or None."""
+        data_field, vertex_field, _ = VERTEX_FIELDS[name]
+        if self.interleaved:
+            if vertex_field is None or not len(self.block.vertex_data):
+                return None
+            if not hasattr(self.block.vertex_data[0], vertex_field):
+                return None
+            return [getattr(vertex, vertex_field) for vertex in self.block.vertex_data]
+        items = getattr(self.block, data_field, None)
+        if name == "uvs":
+            # Only the first UV set is exposed.
+            items = items[0] if items is not None and len(items) else None
+        return items if items is not None and len(items) else None
+
+    def get(self, name):
+        """Return the named array, or None if the block has no such data."""
+        if name not in self.arrays:
+            if name == "triangles":
+                self.arrays[name] = self._read_triangles()
+            else:
+                items = self._source(name)
+                self.arrays[name] = None if items is None else _read_items(
+                    items, VERTEX_FIELDS[name][2], np.float32)[0]
+        return self.arrays[name]
+
+    def set(self, name, array):
+        """Replace the named array; the block is updated by commit()."""
+        dtype = np.int64 if name == "triangles" else np.float32
+        self.arrays[name] = np.asarray(array, dtype=dtype)
+        self.changed.add(name)
+
+    def _triangle_source(self):
+        triangles = getattr(self.block, "triangles", None)
+        if triangles is None or not len(triangles):
+            return None, None
+        if isinstance(triangles, np.ndarray) and triangles.dtype != object:
+            return triangles, None
+        for components in TRIANGLE_COMPONENTS:
+            if hasattr(triangles[0], components[0]):
+                return triangles, components
+        raise ValueError(f"Unknown triangle layout in {type(self.block).__name__}.")
+
+    def _read_triangles(self):
+        triangles, components = self._triangle_source()
+        if triangles is None:
+            return np.zeros((0, 3), dtype=np.int64)
+        return _read_items(triangles, components, np.int64)[0]
+
+    vertices = property(lambda self: self.get("vertices"), lambda self, value: self.set("vertices", value))
+    normals = property(lambda self: self.get("normals"), lambda self, value: self.set("normals", value))
+    tangents = property(lambda self: self.get("tangents"), lambda self, value: self.set("tangents", value))
+    bitangents = property(lambda self: self.get("bitangents"), lambda self, value: self.set("bitangents", value))
+    uvs = property(lambda self: self.get("uvs"), lambda self, value: self.set("uvs", value))
+    colors = property(lambda self: self.get("colors"), lambda self, value: self.set("colors", value))
+    triangles = property(lambda self: self.get("triangles"), lambda self, value: self.set("triangles", value))
+
+    @property
+    def num_vertices(self):
+        vertices = self.get("vertices")
+        return 0 if vertices is None else len(vertices)
+
+    def recompute_normals(self):
+        self.normals = compute_normals(self.vertices, self.triangles)
+
+    def recompute_tangents(self):
+        if self.uvs is None:
+            raise ValueError(f"{type(self.block).__name__} has no UVs to compute tangents from.")
+        tangents, bitangents = compute_tangents(self.vertices, self.normals, self.uvs, self.triangles)
+        # Only the arrays the block stores are written back.
+        if self._source("tangents") is not None:
+            self.tangents = tangents
+        if self._source("bitangents") is not None:
+            self.bitangents = bitangents
+
+    def bounds(self):
+        return compute_bounds(self.vertices)
+
+    def weld(self, tolerance=1e-5):
+        """
+        Merge vertices whose position and other vertex data match within tolerance.
+
+        Returns the number of vertices removed. Triangles are remapped to the
+        merged vertices and degenerate ones dropped. Raises ValueError for strips
+        and skinned meshes, whose other vertex indices would not be remapped.
+        """
+        if hasattr(self.block, "strips") or hasattr(self.block, "strip_lengths"):
+            raise ValueError(f"Cannot weld the vertices of {type(self.block).__name__}, which uses strips.")
+        if self.is_skinned():
+            raise ValueError(f"Cannot weld the vertices of skinned {type(self.block).__name__}.")
+        names = [name for name in VERTEX_FIELDS if self.get(name) is not None]
+        keep, remap = weld_vertices([self.get(name) for name in names], tolerance)
+        removed = self.num_vertices - len(keep)
+        if not removed:
+            return 0
+
+        for name in names:
+            self.arrays[name] = self.arrays[name][keep]
+        self.keep = keep if self.keep is None else self.keep[keep]
+        self.triangles = remove_degenerate(remap[self.triangles])
+        return removed
+
+    def is_skinned(self):
+        """Return whether the block, or a shape using it, has a skin."""
+        shapes = [self.block]
+        if self.query is not None:
+            shapes += self.query.parents(self.block)
+        return any(getattr(shape, field, None) is not None for shape in shapes for field in SKIN_FIELDS)
+
+    def commit(self):
+        """
+        Write the changed arrays back to the block.
+
+        Every array is checked before the block is changed, so a failed commit
+        leaves the block as it was.
+        """
+        self._validate()
+        if self.interleaved and getattr(self.block, "data_size", 0):
+            vertex_size = self._vertex_size()
+        if self.keep is not None:
+            self._apply_weld()
+        for name in sorted(self.changed):
+            if name == "triangles":
+                self._write_triangles()
+                continue
+            _write_items(self._source(name), VERTEX_FIELDS[name][2], self.arrays[name])
+        if self.interleaved and getattr(self.block, "data_size", 0):
+            self.block.data_size = (vertex_size * len(self.block.vertex_data)
+                                    + TRIANGLE_SIZE * len(self.block.triangles))
+        self.changed.clear()
+
+    def _validate(self):
+        for name in self.changed:
+            array = self.arrays[name]
+            if name == "triangles":
+                if self._triangle_source()[0] is None:
+                    raise ValueError(f"{type(self.block).__name__} has no triangles to write to.")
+                if len(array) and array.max() >= self.num_vertices:
+                    raise ValueError(f"triangles index past the {self.num_vertices} vertices.")
+                continue
+            if len(array) != self.num_vertices:
+                raise ValueError(f"{name} has {len(array)} rows for {self.num_vertices} vertices.")
+            if self._source(name) is None:
+                raise ValueError(f"{type(self.block).__name__} has no {name} to write to.")
+
+    def _vertex_size(self):
+        """Return the bytes per vertex in the data size of a BSTriShape."""
+        vertex_bytes = self.block.data_size - TRIANGLE_SIZE * len(self.block.triangles)
+        return vertex_bytes // max(len(self.block.vertex_data), 1)
+
+    def _apply_weld(self):
+        """Cut the block's per-vertex data down to the vertices kept by weld()."""
+        keep = self.keep
+        self.keep = None
+        if self.interleaved:
+            self.block.vertex_data = _select(self.block.vertex_data, keep)
+        else:
+            for data_field, _, _ in VERTEX_FIELDS.values():
+                items = getattr(self.block, data_field, None)
+                if items is None or not len(items):
+                    continue
+                if data_field == "uv_sets":
+                    self.block.uv_sets = [_select(uv_set, keep) for uv_set in items]
+                else:
+                    setattr(self.block, data_field, _select(items, keep))
+        if hasattr(self.block, "num_vertices"):
+            self.block.num_vertices = len(keep)
+        # Weld re-read arrays are views of the old data, so re-read them from the block.
+        self.arrays = {name: array for name, array in self.arrays.items()
+                       if name in self.changed or name == "triangles"}
+
+    def _write_triangles(self):
+        array = self.arrays["triangles"]
+        triangles, components = self._triangle_source()
+        if len(triangles) != len(array):
+            triangles = _resized(triangles, len(array))
+            self.block.triangles = triangles
+        _write_items(triangles, components or ("v_1", "v_2", "v_3"), array)
+        if hasattr(self.block, "num_triangles"):
+            self.block.num_triangles = len(array)
+        if hasattr(self.block, "num_triangle_points"):
+            self.block.num_triangle_points = len(array) * 3
+
+
+def geometry_blocks(query):
+    """Return the blocks of a NifQuery that MeshArrays can wrap."""
+    blocks = []
+    for type_name in GEOMETRY_TYPES:
+        blocks.extend(query.of_type(type_name))
+    return blocks
+
+
+def compute_bounds(vertices):
+    """Return the minimum and maximum corners of the vertices' bounding box."""
+    if not len(vertices):
+        return np.zeros(3, dtype=np.float32), np.zeros(3, dtype=np.float32)
+    return vertices.min(axis=0), vertices.max(axis=0)
+
+
+def compute_bounding_sphere(vertices):
+    """Return the center of the bounding box and the radius enclosing every vertex."""
+    minimum, maximum = compute_bounds(vertices)
+    center = (minimum + maximum) / 2
+    if not len(vertices):
+        return center, 0.0
+    return center, float(np.sqrt(((vertices - center) ** 2).sum(axis=1).max()))
+
+
+def _normalized(vectors):
+    lengths = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return np.divide(vectors, lengths, out=np.zeros_like(vectors), where=lengths > 1e-12)
+
+
+def compute_normals(vertices, triangles):
+    """Return area-weighted vertex normals of a triangle mesh."""
+    normals = np.zeros_like(vertices, dtype=np.float32)
+    if not len(triangles):
+        return normals
+    corners = vertices[triangles]
+    # The cross product's length is twice the triangle's area, weighting the sum.
+    face_normals = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+    for corner in range(3):
+        np.add.at(normals, triangles[:, corner], face_normals)
+    return _normalized(normals)
+
+
+def compute_tangents(vertices, normals, uvs, triangles):
+    """Return per-vertex tangents and bitangents from UV gradients, orthogonal to the normals."""
+    tangents = np.zeros_like(vertices, dtype=np.float32)
+    bitangents = np.zeros_like(vertices, dtype=np.float32)
+    if len(triangles):
+        corners = vertices[triangles]
+        uv_corners = uvs[triangles]
+        edges_1 = corners[:, 1] - corners[:, 0]
+        edges_2 = corners[:, 2] - corners[:, 0]
+        uv_1 = uv_corners[:, 1] - uv_corners[:, 0]
+        uv_2 = uv_corners[:, 2] - uv_corners[:, 0]
+        determinant = uv_1[:, 0] * uv_2[:, 1] - uv_2[:, 0] * uv_1[:, 1]
+        scale = np.divide(1.0, determinant, out=np.zeros_like(determinant), where=np.abs(determinant) > 1e-12)
+        face_tangents = (edges_1 * uv_2[:, 1:2] - edges_2 * uv_1[:, 1:2]) * scale[:, None]
+        face_bitangents = (edges_2 * uv_1[:, 0:1] - edges_1 * uv_2[:, 0:1]) * scale[:, None]
+        for corner in range(3):
+            np.add.at(tangents, triangles[:, corner], face_tangents)
+            np.add.at(bitangents, triangles[:, corner], face_bitangents)
+
+    if normals is not None:
+        # Gram-Schmidt against the normal, keeping the bitangent's handedness.
+        tangents -= normals * (normals * tangents).sum(axis=1, keepdims=True)
+        handedness = np.sign((np.cross(normals, tangents) * bitangents).sum(axis=1, keepdims=True))
+        handedness[handedness == 0] = 1
+        bitangents = np.cross(normals, _normalized(tangents)) * handedness
+    return _normalized(tangents), _normalized(bitangents)
+
+
+def weld_vertices(arrays, tolerance=1e-5):
+    """
+    Find vertices whose values in all the given per-vertex arrays match within tolerance.
+
+    Returns the indices of the vertices to keep (the first of each group, in their
+    original order) and a map from every old vertex index to its new index.
+    """
+    keys = np.hstack([np.round(np.asarray(array, dtype=np.float64) / tolerance) for array in arrays])
+    _, first, inverse = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    order = np.argsort(first)
+    keep = first[order]
+    new_index = np.empty_like(order)
+    new_index[order] = np.arange(len(order))
+    return keep, new_index[inverse]
+
+
+def remove_degenerate(triangles):
+    """Drop triangles that use the same vertex more than once."""
+    triangles = np.asarray(triangles)
+    valid = ((triangles[:, 0] != triangles[:, 1]) & (triangles[:, 1] != triangles[:, 2])
+             & (triangles[:, 0] != triangles[:, 2]))
+    return triangles[valid]
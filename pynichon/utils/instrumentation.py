@@ -0,0 +1,210 @@
+"""Per-file timing, counters and profiling for batch runs."""
+
+import csv
+import heapq
+import json
+import marshal
+import os
+import time
+
+STAGES = ["hash", "read", "parse", "spell", "serialize", "write"]
+
+
+class FileStats:
+    """
+    Stage timings and counters for a single file.
+
+    Stages are timed by calling mark() at the end of each one, which attributes the
+    time since the previous mark to that stage.
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self.stages = {}
+        self.counters = {}
+        self.last = time.perf_counter()
+
+    def mark(self, stage):
+        now = time.perf_counter()
+        self.stages[stage] = self.stages.get(stage, 0.0) + now - self.last
+        self.last = now
+
+    def count(self, counter, value=1):
+        self.counters[counter] = self.counters.get(counter, 0) + value
+
+    @property
+    def total(self):
+        return sum(self.stages.values())
+
+
+class _NullStats:
+    """Stand-in for FileStats when instrumentation is off, so timing calls cost next to nothing."""
+
+    enabled = False
+
+    def mark(self, stage):
+        pass
+
+    def count(self, counter, value=1):
+        pass
+
+
+NULL_STATS = _NullStats()
+
+
+class FileProfiler:
+    """Captures a cProfile or tracemalloc profile of processing one file."""
+
+    def __init__(self, mode):
+        self.mode = mode
+        if mode == "cprofile":
+            import cProfile
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        elif mode == "tracemalloc":
+            import tracemalloc
+            tracemalloc.start()
+        else:
+            raise ValueError(f"Unknown profile mode {mode}.")
+
+    def finish(self):
+        """Stop profiling and return the profile in a picklable form."""
+        if self.mode == "cprofile":
+            import pstats
+            self.profiler.disable()
+            # The marshalled stats dict is the format pstats reads from .prof files.
+            return marshal.dumps(pstats.Stats(self.profiler).stats)
+
+        import tracemalloc
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        lines = [f"peak traced memory: {peak / 1024:.1f} KiB"]
+        lines += [str(stat) for stat in snapshot.statistics("lineno")[:25]]
+        return "\n".join(lines)
+
+
+class JsonLinesSink:
+    """Writes one JSON record per file as results come in."""
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.stream = open(path, "w", encoding="utf-8")
+
+    def record(self, result):
+        stats = result.stats
+        self.stream.write(json.dumps({
+            "input": result.input_path,
+            "output": result.output_path,
+            "status": result.status,
+            "error": result.error,
+            "stages": stats.stages if stats else {},
+            "counters": stats.counters if stats else {},
+        }) + "\n")
+
+    def close(self):
+        self.stream.close()
+
+
+class CsvSummarySink:
+    """Writes a CSV summary of every stage and counter over the whole run."""
+
+    def __init__(self, path):
+        self.path = path
+        self.stage_times = {}
+        self.counters = {}
+        self.files = 0
+
+    def record(self, result):
+        self.files += 1
+        if not result.stats:
+            return
+        for stage, seconds in result.stats.stages.items():
+            self.stage_times.setdefault(stage, []).append(seconds)
+        for counter, value in result.stats.counters.items():
+            self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def close(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["metric", "files", "total", "mean", "p50", "p95", "max"])
+            for stage in sorted(self.stage_times, key=lambda s: STAGES.index(s) if s in STAGES else len(STAGES)):
+                times = sorted(self.stage_times[stage])
+                writer.writerow([
+                    f"{stage}_seconds", len(times), f"{sum(times):.6f}", f"{sum(times) / len(times):.6f}",
+                    f"{times[len(times) // 2]:.6f}", f"{times[min(int(len(times) * 0.95), len(times) - 1)]:.6f}",
+                    f"{times[-1]:.6f}"])
+            for counter, value in sorted(self.counters.items()):
+                writer.writerow([counter, self.files, value, "", "", "", ""])
+
+
+class SlowestProfilesSink:
+    """Keeps the profiles of the N slowest files and writes them out when the run ends."""
+
+    def __init__(self, output_dir, count):
+        self.output_dir = output_dir
+        self.count = count
+        self.slowest = []
+        self.counter = 0
+
+    def record(self, result):
+        if result.profile is None or not result.stats:
+            return
+        # The counter breaks ties so results themselves are never compared.
+        self.counter += 1
+        entry = (result.stats.total, self.counter, result)
+        if len(self.slowest) < self.count:
+            heapq.heappush(self.slowest, entry)
+        else:
+            heapq.heappushpop(self.slowest, entry)
+
+    def close(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        ranked = sorted(self.slowest, key=lambda entry: entry[0], reverse=True)
+        for rank, (seconds, _, result) in enumerate(ranked, 1):
+            name = f"{rank:03d}_{os.path.basename(result.input_path)}"
+            if isinstance(result.profile, bytes):
+                with open(os.path.join(self.output_dir, name + ".prof"), "wb") as f:
+                    f.write(result.profile)
+            else:
+                with open(os.path.join(self.output_dir, name + ".txt"), "w") as f:
+                    f.write(f"{result.input_path}: {seconds:.3f}s\n{result.profile}\n")
+
+
+class Instrumentation:
+    """
+    Collects per-file stage timings and counters from a batch and feeds them to sinks.
+
+    Pass an instance to IOManager.process_files to enable it. The profile mode, if
+    set, captures a "cprofile" or "tracemalloc" profile of every file in the workers,
+    for a SlowestProfilesSink to keep the slowest of.
+    """
+
+    def __init__(self, sinks=None, profile_mode=None):
+        self.sinks = list(sinks or [])
+        self.profile_mode = profile_mode
+        self.totals = {}
+        self.counters = {}
+        self.files = 0
+
+    def record(self, result):
+        self.files += 1
+        if result.stats:
+            for stage, seconds in result.stats.stages.items():
+                self.totals[stage] = self.totals.get(stage, 0.0) + seconds
+            for counter, value in result.stats.counters.items():
+                self.counters[counter] = self.counters.get(counter, 0) + value
+        for sink in self.sinks:
+            sink.record(result)
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+    def summary(self):
+        """Return a short text summary of total time per stage and counters."""
+        lines = [f"{stage}: {self.totals[stage]:.3f}s" for stage in STAGES if stage in self.totals]
+        lines += [f"{counter}: {value}" for counter, value in sorted(self.counters.items())]
+        return "\n".join(lines)
@@ -0,0 +1,195 @@
+"""Indexed lookups over the blocks of a loaded NIF, shared by the spells run on it."""
+
+import threading
+from contextlib import contextmanager
+
+# Fields of the NIF format that point back up the scene graph (Ptr rather than Ref),
+# which are not followed when linking parents to children.
+POINTER_FIELDS = {
+    "target", "skeleton_root", "bones", "entities", "look_at", "look_at_node", "emitter",
+    "emitter_object", "extra_targets", "av_object", "scene_root",
+}
+
+# Bookkeeping attributes of nifgen structs that refer to the file or its types.
+_SKIPPED_FIELDS = {"context", "_context", "arg", "template", "io_start", "io_size", "name"}
+
+
+class NifQuery:
+    """
+    A lazy, cached index of a NIF's blocks by type, by name and by parent/child link.
+
+    Each index is built on first use and reused by every later lookup, and by every
+    spell of a pipeline run on the same NIF. The indexes are rebuilt automatically
+    when blocks are added or removed; a spell that changes links or names without
+    changing the number of blocks should call invalidate().
+    """
+
+    def __init__(self, nif_data):
+        self.nif_data = nif_data
+        self._block_count = None
+        self.invalidate()
+
+    def invalidate(self):
+        """Drop every index, so they are rebuilt from the current blocks on next use."""
+        self._types = None
+        self._names = None
+        self._children = None
+        self._parents = None
+        self._geometry = None
+
+    @property
+    def blocks(self):
+        return list(getattr(self.nif_data, "blocks", None) or ())
+
+    @property
+    def roots(self):
+        return list(getattr(self.nif_data, "roots", None) or ())
+
+    def _check(self):
+        block_count = len(getattr(self.nif_data, "blocks", None) or ())
+        if block_count != self._block_count:
+            self._block_count = block_count
+            self.invalidate()
+
+    def _type_index(self):
+        self._check()
+        if self._types is None:
+            self._types = {}
+            for block in self.blocks:
+                for cls in type(block).__mro__[:-1]:
+                    self._types.setdefault(cls.__name__, []).append(block)
+        return self._types
+
+    def _name_index(self):
+        self._check()
+        if self._names is None:
+            self._names = {}
+            for block in self.blocks:
+                name = getattr(block, "name", None)
+                if name is not None:
+                    self._names.setdefault(str(name), []).append(block)
+        return self._names
+
+    def _link_index(self):
+        self._check()
+        if self._children is None:
+            blocks = self.blocks
+            block_ids = {id(block) for block in blocks}
+            self._children = {}
+            self._parents = {}
+            for block in blocks:
+                children = self._find_links(block, block_ids)
+                self._children[id(block)] = children
+                for child in children:
+                    self._parents.setdefault(id(child), []).append(block)
+        return self._children, self._parents
+
+    def _find_links(self, block, block_ids):
+        """Return the blocks referenced from a block's fields, including nested structs."""
+        links = []
+        linked = set()
+        visited = {id(block)}
+        stack = [block]
+        while stack:
+            fields = getattr(stack.pop(), "__dict__", None) or {}
+            for field, value in fields.items():
+                if field in _SKIPPED_FIELDS or field in POINTER_FIELDS or value is self.nif_data:
+                    continue
+                if isinstance(value, (list, tuple)) or getattr(value, "dtype", None) == object:
+                    values = value
+                else:
+                    values = (value,)
+                for item in values:
+                    if item is None or isinstance(item, (str, bytes, int, float, bool)):
+                        continue
+                    if id(item) in block_ids:
+                        if id(item) not in linked and item is not block:
+                            linked.add(id(item))
+                            links.append(item)
+                    elif id(item) not in visited and hasattr(item, "__dict__"):
+                        visited.add(id(item))
+                        stack.append(item)
+        return links
+
+    def of_type(self, type_name):
+        """Return the blocks of the given type, or of a type derived from it."""
+        return list(self._type_index().get(type_name, ()))
+
+    def first(self, type_name):
+        """Return the first block of the given type, or None."""
+        blocks = self._type_index().get(type_name)
+        return blocks[0] if blocks else None
+
+    def has_type(self, type_name):
+        return type_name in self._type_index()
+
+    def named(self, name):
+        """Return the blocks with the given name."""
+        return list(self._name_index().get(name, ()))
+
+    def find(self, name):
+        """Return the first block with the given name, or None."""
+        blocks = self._name_index().get(name)
+        return blocks[0] if blocks else None
+
+    def children(self, block):
+        """Return the blocks the given block references."""
+        return list(self._link_index()[0].get(id(block), ()))
+
+    def parents(self, block):
+        """Return the blocks referencing the given block."""
+        return list(self._link_index()[1].get(id(block), ()))
+
+    def parent(self, block):
+        """Return the first block referencing the given block, or None."""
+        parents = self._link_index()[1].get(id(block))
+        return parents[0] if parents else None
+
+    def geometry(self):
+        """
+        Return a MeshArrays for every geometry block, exposing its vertex data and
+        triangles as NumPy arrays (see pynichon.utils.geometry).
+        """
+        # Imported here so spells that do not touch geometry do not pay for NumPy.
+        from pynichon.utils.geometry import MeshArrays, geometry_blocks
+
+        self._check()
+        if self._geometry is None:
+            self._geometry = [MeshArrays(block, self) for block in geometry_blocks(self)]
+        return list(self._geometry)
+
+    def walk(self, start=None):
+        """Yield every block reachable from start (or from the roots) once, depth first."""
+        children = self._link_index()[0]
+        stack = [start] if start is not None else list(reversed(self.roots))
+        seen = set()
+        while stack:
+            block = stack.pop()
+            if id(block) in seen:
+                continue
+            seen.add(id(block))
+            yield block
+            stack.extend(reversed(children.get(id(block), ())))
+
+
+_scope = threading.local()
+
+
+@contextmanager
+def query_scope(nif_data):
+    """
+    Provide the NifQuery for a NIF, shared with any enclosing scope on the same NIF.
+
+    The query is dropped when the outermost scope ends, so it never outlives the run
+    of the spells on that NIF.
+    """
+    active = getattr(_scope, "query", None)
+    if active is not None and active.nif_data is nif_data:
+        yield active
+        return
+
+    _scope.query = NifQuery(nif_data)
+    try:
+        yield _scope.query
+    finally:
+        _scope.query = active
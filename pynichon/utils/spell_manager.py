@@ -1,35 +1,97 @@
-import importlib
+import functools
+import hashlib
+import importlib.util
 import json
 import os
 from pathlib import Path
 
+from pynichon.utils.nif_query import query_scope
+from pynichon.utils.spell_options import OptionsModel
+
 
 spell_manager = None
 
+SPELL_CACHE_NAME = ".spell_metadata.cache"
+
 class SpellManager:
     _instance = None
 
     def __init__(self):
-        self.spells_dir = "pynichon\spells"
+        self.spells_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "spells")
+        self.cache_path = os.path.join(self.spells_dir, SPELL_CACHE_NAME)
         self.spells = {}
         self.load_spells()
 
     def load_spells(self):
+        """
+        Register every spell and pipeline defined in the spells directory.
+
+        Spell JSONs are parsed once and their contents cached in the spells directory,
+        keyed on path and validated by mtime and size, so unchanged spells are not
+        re-parsed on later startups. Spell code is only imported when first run.
+        """
         from pynichon.io.io_manager import get_io_manager
 
+        cache = self.read_cache()
+        new_cache = {}
         for json_path in get_io_manager().get_spell_files(self.spells_dir):
             try:
-                with open(json_path, "r") as f:
-                    config = json.load(f)
-                    spell_name = config["Info"]["Name"]
-                    self.spells[spell_name] = Spell(json_path)
-            except (KeyError, json.JSONDecodeError):
+                stat = os.stat(json_path)
+                entry = cache.get(json_path)
+                if entry and entry["mtime"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+                    config = entry["config"]
+                else:
+                    with open(json_path, "r") as f:
+                        config = json.load(f)
+                new_cache[json_path] = {"mtime": stat.st_mtime_ns, "size": stat.st_size, "config": config}
+
+                spell_name = config["Info"]["Name"]
+                if "Pipeline" in config:
+                    self.spells[spell_name] = Pipeline(config["Pipeline"], json_path, config)
+                else:
+                    self.spells[spell_name] = Spell(json_path, config)
+            except (KeyError, OSError, json.JSONDecodeError):
                 print(f"Failed to load spell from {json_path}")
 
-    def run_spell(self, nif_data, spell):
+        if new_cache != cache:
+            self.write_cache(new_cache)
+
+    def read_cache(self):
+        try:
+            with open(self.cache_path, "r") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+
+    def write_cache(self, cache):
+        # The spells directory may be read-only, in which case spells are parsed on every startup.
+        try:
+            temp_path = self.cache_path + ".tmp"
+            with open(temp_path, "w") as f:
+                json.dump(cache, f)
+            os.replace(temp_path, self.cache_path)
+        except OSError:
+            pass
+
+    def get_spell(self, spell):
         if spell not in self.spells:
             raise ValueError(f"Spell {spell} not found.")
-        self.spells[spell].execute(nif_data)
+        return self.spells[spell]
+
+    def resolve(self, spell):
+        """Return the spell for a name, or an ad-hoc pipeline for a list of names."""
+        if isinstance(spell, (list, tuple)):
+            return Pipeline(spell)
+        return self.get_spell(spell)
+
+    def run_spell(self, nif_data, spell, options=None):
+        return self.get_spell(spell).execute(nif_data, options)
+
+    def invalidate(self, spell=None):
+        """Drop cached spell code so it is re-imported on next use (all spells if none given)."""
+        spells = self.spells.values() if spell is None else [self.get_spell(spell)]
+        for s in spells:
+            s.invalidate()
 
 
 def get_spell_manager():
@@ -39,22 +101,250 @@ def get_spell_manager():
     return spell_manager
 
 
+class SpellModuleCache:
+    """
+    Cache of imported spell modules.
+
+    Entries are keyed on the module path and validated against the file's mtime and
+    size. When those change, the source is hashed and only re-executed if its
+    contents actually differ.
+    """
+
+    def __init__(self):
+        self.entries = {}
+
+    def get(self, py_path, module_name):
+        """Return the up-to-date module and source hash for the given path."""
+        stat = os.stat(py_path)
+        entry = self.entries.get(py_path)
+        if entry and entry["mtime"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+            return entry["module"], entry["hash"]
+
+        with open(py_path, "rb") as f:
+            source = f.read()
+        source_hash = hashlib.sha1(source).hexdigest()
+
+        if entry and entry["hash"] == source_hash:
+            module = entry["module"]
+        else:
+            spec = importlib.util.spec_from_file_location(module_name, py_path)
+            module = importlib.util.module_from_spec(spec)
+            exec(compile(source, py_path, "exec"), module.__dict__)
+
+        self.entries[py_path] = {
+            "mtime": stat.st_mtime_ns, "size": stat.st_size, "hash": source_hash, "module": module
+        }
+        return module, source_hash
+
+    def invalidate(self, py_path=None):
+        if py_path is None:
+            self.entries.clear()
+        else:
+            self.entries.pop(py_path, None)
+
+
+spell_module_cache = SpellModuleCache()
+
+
 class Spell:
-    def __init__(self, json_path):
+    def __init__(self, json_path, config=None):
         self.json_path = json_path
         self.stem = Path(json_path).stem
         self.py_path = json_path.replace(".json", ".py")
         self.category = str(Path(json_path).parent.name).capitalize()
+        self.options = (config or {}).get("Options", [])
+        self.applies_to = (config or {}).get("Applies To", {})
+        self.modifies = (config or {}).get("Modifies")
+        self.function = None
+        self.source_hash = None
+
+    @property
+    def has_filter(self):
+        return bool(self.applies_to)
+
+    @property
+    def modified_types(self):
+        """
+        Return the block types the spell changes, or None if it does not declare them.
+
+        Spells declare them with an optional "Modifies" list in their JSON, for
+        example "Modifies": ["NiTriShapeData", "BSTriShape"]. Such a spell may only
+        change the contents of blocks of those types: no blocks are added, removed
+        or reordered, and no strings are added. Files it changes are then saved by
+        splicing the changed blocks into the input's bytes.
+        """
+        return set(self.modifies) if self.modifies is not None else None
+
+    def options_model(self):
+        return OptionsModel(self.options)
+
+    def accepts(self, header):
+        """
+        Return whether the spell applies to a file with the given NifHeader.
 
-    def execute(self, nif_data):
+        Spells narrow the files they run on with an optional "Applies To" section in
+        their JSON, for example:
+
+            "Applies To": {"Versions": ["20.2.0.7"], "BS Versions": [34], "Block Types": ["bhkCollisionObject"]}
+
+        A file matches if its versions are listed and it contains any of the block types.
+        """
+        from pynichon.io.nif_header import version_from_string
+
+        applies_to = self.applies_to
+        if "Versions" in applies_to and header.version not in {
+                version_from_string(version) for version in applies_to["Versions"]}:
+            return False
+        if "User Versions" in applies_to and header.user_version not in applies_to["User Versions"]:
+            return False
+        if "BS Versions" in applies_to and header.bs_version not in applies_to["BS Versions"]:
+            return False
+        if "Block Types" in applies_to:
+            block_types = header.block_type_names()
+            if block_types is not None and block_types.isdisjoint(applies_to["Block Types"]):
+                return False
+        return True
+
+    def load(self):
+        """
+        Return the spell function, re-importing the module only if its source changed.
+
+        The resolved function is kept on the spell, so callers that dispatch many
+        files should call this once and invoke the returned function directly.
+        A spell function may return False to report that it left the NIF untouched.
+        """
         if not os.path.exists(self.py_path):
             raise FileNotFoundError(f"Python file not found for spell: {self.stem}")
 
-        spec = importlib.util.spec_from_file_location("spell_module", self.py_path)
-        spell_module = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(spell_module)
+        module_name = f"pynichon_spell_{self.category.lower()}_{self.stem}"
+        spell_module, self.source_hash = spell_module_cache.get(self.py_path, module_name)
 
         if hasattr(spell_module, self.stem):
-            getattr(spell_module, self.stem)(nif_data)
+            self.function = getattr(spell_module, self.stem)
+            return self.function
         else:
-            raise AttributeError(f"No function {self.stem} in module {self.py_path}")
\ No newline at end of file
+            raise AttributeError(f"No function {self.stem} in module {self.py_path}")
+
+    def bind(self, options):
+        """
+        Return a function running the spell on a NIF with the given option values.
+
+        Option values, normally an OptionsSnapshot, are passed to spell functions
+        that take an "options" argument, and a NifQuery indexing the NIF's blocks to those that take a "query" argument.
+        """
+        import inspect
+
+        function = self.function or self.load()
+        parameters = inspect.signature(function).parameters
+        if "options" in parameters:
+            function = functools.partial(function, options=options)
+        if "query" not in parameters:
+            return function
+
+        def run_spell(nif_data):
+            with query_scope(nif_data) as query:
+                return function(nif_data, query=query)
+
+        return run_spell
+
+    def invalidate(self):
+        self.function = None
+        self.source_hash = None
+        spell_module_cache.invalidate(self.py_path)
+
+    def execute(self, nif_data, options=None):
+        """Run the spell on a NIF, with the given option values or the defaults."""
+        return self.bind(self.options_model().snapshot(options))(nif_data)
+
+
+class Pipeline:
+    """
+    An ordered list of spells applied to each file in a single load/save pass.
+
+    Pipelines are defined in a JSON file alongside the spell JSONs, with the names
+    of their stages listed under "Pipeline":
+
+        {"Info": {"Name": "Cleanup"}, "Pipeline": ["Fix Shaders", "Remove Collision"]}
+    """
+
+    def __init__(self, stages, json_path=None, config=None):
+        self.stages = list(stages)
+        self.json_path = json_path
+        self.stem = Path(json_path).stem if json_path else None
+        self.category = str(Path(json_path).parent.name).capitalize() if json_path else None
+        self.options = (config or {}).get("Options", [])
+        self.function = None
+        self.source_hash = None
+        self.stage_spells = []
+        self.loading = False
+
+    def load(self, options=None):
+        """Resolve every stage and return a function running them in order."""
+        if self.loading:
+            raise ValueError(f"Pipeline {self.stem} includes itself.")
+        if not self.stages:
+            raise ValueError(f"Pipeline {self.stem} has no spells.")
+
+        self.loading = True
+        try:
+            stages = [get_spell_manager().get_spell(stage) for stage in self.stages]
+            for stage in stages:
+                stage.load()
+            functions = [stage.bind(options) for stage in stages]
+        finally:
+            self.loading = False
+        self.stage_spells = stages
+
+        def run_pipeline(nif_data):
+            modified = False
+            # Stages taking a query share a single index of the NIF.
+            with query_scope(nif_data):
+                for function in functions:
+                    if function(nif_data) is not False:
+                        modified = None
+            return modified
+
+        self.function = run_pipeline
+        self.source_hash = hashlib.sha1(
+            "".join(stage.source_hash for stage in stages).encode()).hexdigest()
+        return self.function
+
+    def bind(self, options):
+        """Return a function running every stage with the given option values."""
+        return self.load(options)
+
+    @property
+    def has_filter(self):
+        return bool(self.stage_spells) and all(stage.has_filter for stage in self.stage_spells)
+
+    @property
+    def modified_types(self):
+        """Return the block types changed by any stage, or None unless every stage declares them."""
+        if not self.stage_spells or any(stage.modified_types is None for stage in self.stage_spells):
+            return None
+        return set().union(*(stage.modified_types for stage in self.stage_spells))
+
+    def options_model(self):
+        """Return the options of the pipeline and of all its stages, which share their values."""
+        if self.loading:
+            raise ValueError(f"Pipeline {self.stem} includes itself.")
+        self.loading = True
+        try:
+            model = OptionsModel(self.options)
+            for stage in self.stages:
+                model.merge(get_spell_manager().get_spell(stage).options_model())
+        finally:
+            self.loading = False
+        return model
+
+    def accepts(self, header):
+        """Return whether any stage applies to a file with the given NifHeader."""
+        return any(stage.accepts(header) for stage in self.stage_spells)
+
+    def invalidate(self):
+        self.function = None
+        self.source_hash = None
+
+    def execute(self, nif_data, options=None):
+        """Run every stage on a NIF, with the given option values or the defaults."""
+        return self.bind(self.options_model().snapshot(options))(nif_data)
\ No newline at end of file
@@ -0,0 +1,189 @@
+"""Typed spell options, parsed from a spell's JSON "Options" into immutable snapshots."""
+
+from collections.abc import Mapping
+
+TRUE_STRINGS = {"1", "true", "yes", "on", "y"}
+FALSE_STRINGS = {"0", "false", "no", "off", "n", ""}
+
+# Option types that only lay out the options panel and hold no value.
+LAYOUT_TYPES = {"Paragraph"}
+
+
+def parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in TRUE_STRINGS:
+        return True
+    if text in FALSE_STRINGS:
+        return False
+    raise ValueError(f"expected a yes/no value, got {value!r}")
+
+
+class OptionSpec:
+    """
+    One option of a spell, as defined in its JSON.
+
+    Options are named by their "Name", or by their "Label" if they have none. A
+    "Textbox" option can declare a "Value Type" of "Integer" or "Float" to be parsed
+    as a number.
+    """
+
+    def __init__(self, option):
+        self.name = option.get("Name", option.get("Label"))
+        self.type = option["Type"]
+        self.choices = tuple(option.get("Options", ()))
+        self.columns = tuple(column.get("Widget", "Textbox") for column in option.get("Columns", ()))
+        self.value_type = option.get("Value Type")
+        self.default = self.empty()
+        if "Default" in option:
+            try:
+                self.default = self.parse(option["Default"])
+            except ValueError:
+                # Placeholder defaults, such as "" for a dropdown, leave the option empty.
+                pass
+
+    def empty(self):
+        if self.type == "Checkbox":
+            return False
+        if self.type == "Table":
+            return ()
+        if self.type in ("Dropdown", "Radio Buttons") and self.choices:
+            return self.choices[0]
+        if self.value_type in ("Integer", "Float"):
+            return None
+        return ""
+
+    def parse(self, value):
+        """Return a value of this option, from a string or from a widget's value."""
+        try:
+            if self.type == "Checkbox":
+                return parse_bool(value)
+            if self.type == "Table":
+                return self.parse_table(value)
+            if self.type in ("Dropdown", "Radio Buttons"):
+                value = str(value)
+                if self.choices and value not in self.choices:
+                    raise ValueError(f"expected one of {', '.join(self.choices)}, got {value!r}")
+                return value
+            if self.value_type == "Integer":
+                return int(value)
+            if self.value_type == "Float":
+                return float(value)
+            return str(value)
+        except ValueError as e:
+            raise ValueError(f"Invalid value for option {self.name}: {e}")
+
+    def parse_table(self, value):
+        """
+        Return table rows as a tuple of tuples, from rows of cell values or from a
+        string with rows separated by ";" and cells by ",".
+        """
+        if isinstance(value, str):
+            value = [row.split(",") for row in value.split(";") if row.strip()]
+        rows = []
+        for row in value:
+            row = list(row) + [""] * (len(self.columns) - len(row))
+            rows.append(tuple(
+                parse_bool(cell) if widget == "Checkbox" else str(cell).strip()
+                for widget, cell in zip(self.columns, row)))
+        return tuple(rows)
+
+
+def option_rows(options):
+    """Return the number of rows of the options panel the given options take up."""
+    return max((option.get("Style", {}).get("Row", 0) + option.get("Style", {}).get("Height", 1)
+                for option in options), default=0)
+
+
+class OptionsModel:
+    """
+    The options of a spell (or of every stage of a pipeline), by name.
+
+    options holds the JSON definitions the options panel is built from, with the
+    options of each merged model laid out below those before it.
+    """
+
+    def __init__(self, options=()):
+        self.specs = {}
+        self.options = []
+        self.add(options)
+
+    def add(self, options, row_offset=0):
+        for option in options:
+            if option.get("Type") not in LAYOUT_TYPES:
+                spec = OptionSpec(option)
+                if not spec.name or spec.name in self.specs:
+                    # Pipeline stages sharing an option name share its value; the first definition wins.
+                    continue
+                self.specs[spec.name] = spec
+            if row_offset:
+                style = option.get("Style", {})
+                option = dict(option, Style=dict(style, Row=style.get("Row", 0) + row_offset))
+            self.options.append(option)
+
+    def merge(self, other):
+        self.add(other.options, option_rows(self.options))
+
+    def snapshot(self, values=None):
+        """
+        Validate option values and return them with every default filled in.
+
+        Values may be strings (as given on the command line) or widget values.
+        Raises ValueError for unknown options and invalid values.
+        """
+        values = dict(values or {})
+        unknown = [name for name in values if name not in self.specs]
+        if unknown:
+            raise ValueError(f"Unknown option {', '.join(map(repr, unknown))}. "
+                             f"Options are: {', '.join(self.specs) or 'none'}.")
+        return OptionsSnapshot({
+            name: spec.parse(values[name]) if name in values else spec.default
+            for name, spec in self.specs.items()})
+
+
+class OptionsSnapshot(Mapping):
+    """
+    Immutable, hashable option values of one run, passed to every spell call.
+
+    Built once per run by OptionsModel.snapshot, and pickled once to each worker
+    process with the IOManager.
+    """
+
+    __slots__ = ("_values", "_items")
+
+    def __init__(self, values=None):
+        self._values = dict(values or {})
+        self._items = tuple(sorted(self._values.items()))
+
+    def __getitem__(self, name):
+        return self._values[name]
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __hash__(self):
+        return hash(self._items)
+
+    def __eq__(self, other):
+        if isinstance(other, OptionsSnapshot):
+            return self._items == other._items
+        return Mapping.__eq__(self, other)
+
+    def __repr__(self):
+        return f"OptionsSnapshot({self._values!r})"
+
+    def __getstate__(self):
+        return self._values
+
+    def __setstate__(self, values):
+        self._values = values
+        self._items = tuple(sorted(values.items()))
+
+    def key(self):
+        """Return the values as plain JSON data, for manifests and cache keys."""
+        return {name: [list(row) for row in value] if isinstance(value, tuple) else value
+                for name, value in self._items}
@@ -0,0 +1,136 @@
+import pytest
+
+from pynichon.io.archive import (BSA_COMPRESSED, BSA_DIRECTORY_NAMES, BSA_EMBED_NAMES, BSA_FILE_NAMES,
+                                 Ba2Archive, Ba2Writer, BsaArchive, BsaWriter, normalize_name, open_archive,
+                                 repack_archive)
+
+FILES = {
+    "meshes\\armor\\iron\\cuirass.nif": b"cuirass" * 100,
+    "meshes\\armor\\iron\\helmet.nif": b"helmet",
+    "meshes\\clutter\\bucket.nif": bytes(range(256)) * 4,
+    "meshes\\empty.nif": b"",
+}
+
+BSA_FLAGS = BSA_DIRECTORY_NAMES | BSA_FILE_NAMES
+
+BSA_VARIANTS = [
+    (103, BSA_FLAGS),
+    (103, BSA_FLAGS | BSA_COMPRESSED),
+    (104, BSA_FLAGS),
+    (104, BSA_FLAGS | BSA_COMPRESSED),
+    (104, BSA_FLAGS | BSA_EMBED_NAMES),
+    (104, BSA_FLAGS | BSA_COMPRESSED | BSA_EMBED_NAMES),
+    (105, BSA_FLAGS),
+    (105, BSA_FLAGS | BSA_COMPRESSED),
+    (105, BSA_FLAGS | BSA_COMPRESSED | BSA_EMBED_NAMES),
+]
+
+
+def read_all(archive):
+    return {normalize_name(entry.name): archive.read(entry) for entry in archive.entries}
+
+
+def write_bsa(path, version, flags, files=FILES):
+    writer = BsaWriter(version, flags)
+    for name, data in files.items():
+        writer.add(name, data)
+    writer.write(str(path))
+
+
+def write_ba2(path, compressed, files=FILES):
+    writer = Ba2Writer(compressed=compressed)
+    for name, data in files.items():
+        writer.add(name, data)
+    writer.write(str(path))
+
+
+def skip_without_lz4(version, flags):
+    if version == 105 and flags & BSA_COMPRESSED:
+        pytest.importorskip("lz4.frame")
+
+
+@pytest.mark.parametrize("version, flags", BSA_VARIANTS)
+def test_bsa_round_trip(tmp_path, version, flags):
+    skip_without_lz4(version, flags)
+    path = tmp_path / "test.bsa"
+    write_bsa(path, version, flags)
+
+    archive = open_archive(str(path))
+    try:
+        assert isinstance(archive, BsaArchive)
+        assert read_all(archive) == FILES
+    finally:
+        archive.close()
+
+
+@pytest.mark.parametrize("version, flags", BSA_VARIANTS)
+def test_bsa_repack(tmp_path, version, flags):
+    skip_without_lz4(version, flags)
+    path = tmp_path / "test.bsa"
+    write_bsa(path, version, flags)
+    replacement = tmp_path / "helmet.nif"
+    replacement.write_bytes(b"new helmet")
+    added = tmp_path / "added.nif"
+    added.write_bytes(b"added")
+
+    archive = open_archive(str(path))
+    repack_archive(archive, str(tmp_path / "repacked.bsa"), {
+        "meshes\\armor\\iron\\helmet.nif": str(replacement),
+        "meshes\\added.nif": str(added),
+    })
+    archive.close()
+
+    repacked = open_archive(str(tmp_path / "repacked.bsa"))
+    try:
+        assert repacked.version == version
+        expected = dict(FILES, **{"meshes\\armor\\iron\\helmet.nif": b"new helmet", "meshes\\added.nif": b"added"})
+        assert read_all(repacked) == expected
+    finally:
+        repacked.close()
+
+
+def test_bsa_repack_in_place(tmp_path):
+    path = tmp_path / "test.bsa"
+    write_bsa(path, 104, BSA_FLAGS | BSA_COMPRESSED)
+    replacement = tmp_path / "bucket.nif"
+    replacement.write_bytes(b"new bucket")
+
+    archive = open_archive(str(path))
+    repack_archive(archive, str(path), {"meshes\\clutter\\bucket.nif": str(replacement)})
+
+    repacked = open_archive(str(path))
+    try:
+        assert read_all(repacked) == dict(FILES, **{"meshes\\clutter\\bucket.nif": b"new bucket"})
+    finally:
+        repacked.close()
+
+
+@pytest.mark.parametrize("compressed", [False, True])
+def test_ba2_round_trip(tmp_path, compressed):
+    path = tmp_path / "test.ba2"
+    write_ba2(path, compressed)
+
+    archive = open_archive(str(path))
+    try:
+        assert isinstance(archive, Ba2Archive)
+        assert read_all(archive) == FILES
+    finally:
+        archive.close()
+
+
+@pytest.mark.parametrize("compressed", [False, True])
+def test_ba2_repack(tmp_path, compressed):
+    path = tmp_path / "test.ba2"
+    write_ba2(path, compressed)
+    replacement = tmp_path / "cuirass.nif"
+    replacement.write_bytes(b"new cuirass")
+
+    archive = open_archive(str(path))
+    repack_archive(archive, str(tmp_path / "repacked.ba2"), {"meshes\\armor\\iron\\cuirass.nif": str(replacement)})
+    archive.close()
+
+    repacked = open_archive(str(tmp_path / "repacked.ba2"))
+    try:
+        assert read_all(repacked) == dict(FILES, **{"meshes\\armor\\iron\\cuirass.nif": b"new cuirass"})
+    finally:
+        repacked.close()
@@ -0,0 +1,142 @@
+import json
+import multiprocessing
+import os
+import types
+
+import pytest
+
+from pynichon.io import nif_io
+from pynichon.io.batch import FAILED, FILTERED, PROCESSED, BatchControl, FileResult, run_serial
+from pynichon.io.io_manager import IOManager
+from pynichon.utils import spell_manager as spell_manager_module
+from pynichon.utils.spell_manager import Spell, SpellManager
+
+# Pool workers only see the stub format module if they are forked from the test process.
+needs_fork = pytest.mark.skipif(multiprocessing.get_start_method() != "fork",
+                                reason="workers are not forked")
+
+SPELL_SOURCE = '''
+def upper(nif_data):
+    if nif_data.payload.startswith(b"boom"):
+        raise ValueError("boom")
+    nif_data.payload = nif_data.payload.upper()
+'''
+
+
+class StubNifFile:
+    """A NIF format whose files are "STUBNIF" and a line break, followed by a payload."""
+
+    MAGIC = b"STUBNIF\n"
+
+    def __init__(self, payload):
+        self.payload = payload
+
+    @classmethod
+    def inspect_version_only(cls, stream):
+        position = stream.tell()
+        magic = stream.read(len(cls.MAGIC))
+        stream.seek(position)
+        return None, ((0x14020007, 12, 83) if magic == cls.MAGIC else (-2, 0, 0))
+
+    @classmethod
+    def from_stream(cls, stream):
+        stream.read(len(cls.MAGIC))
+        return cls(stream.read())
+
+    def write(self, stream):
+        stream.write(self.MAGIC + self.payload)
+
+
+@pytest.fixture
+def spell(tmp_path, monkeypatch):
+    monkeypatch.setattr(nif_io, "_nif_format", types.SimpleNamespace(NifFile=StubNifFile))
+    spell_dir = tmp_path / "spells" / "nif"
+    spell_dir.mkdir(parents=True)
+    config = {"Info": {"Name": "Upper"}}
+    (spell_dir / "upper.json").write_text(json.dumps(config))
+    (spell_dir / "upper.py").write_text(SPELL_SOURCE)
+    manager = SpellManager()
+    manager.spells["Upper"] = Spell(str(spell_dir / "upper.json"), config)
+    monkeypatch.setattr(spell_manager_module, "spell_manager", manager)
+    return "Upper"
+
+
+@pytest.fixture
+def io_manager(tmp_path):
+    input_dir = tmp_path / "input"
+    input_dir.mkdir()
+    for index in range(12):
+        payload = b"boom" if index == 3 else f"mesh {index}".encode() * (index + 1)
+        (input_dir / f"{index:02d}.nif").write_bytes(StubNifFile.MAGIC + payload)
+    io_manager = IOManager()
+    io_manager.input_paths = [str(input_dir)]
+    io_manager.output_dir = str(tmp_path / "output")
+    return io_manager
+
+
+def read(file_path):
+    with open(file_path, "rb") as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("workers, write_back", [(1, False), (1, True), pytest.param(3, False, marks=needs_fork)])
+def test_input_order(spell, io_manager, workers, write_back):
+    io_manager.workers = workers
+    io_manager.write_back = write_back
+    io_manager.skip_errors = True
+
+    results = io_manager.process_files(spell)
+
+    assert [result.input_path for result in results] == list(io_manager.iter_input_files())
+    assert [result.status for result in results] == [FAILED if index == 3 else PROCESSED for index in range(12)]
+    for result in results:
+        if result.status == PROCESSED:
+            assert read(result.output_path) == StubNifFile.MAGIC + read(result.input_path)[8:].upper()
+
+
+@needs_fork
+def test_large_file_lane_order(spell, io_manager):
+    io_manager.workers = 2
+    io_manager.skip_errors = True
+    # The later, larger files go to the large-file lane.
+    io_manager.large_file_size = 60
+
+    results = io_manager.process_files(spell)
+
+    assert [result.input_path for result in results] == list(io_manager.iter_input_files())
+    assert sum(io_manager.is_large_file(result.input_path) for result in results) > 1
+
+
+@pytest.mark.parametrize("workers", [1, pytest.param(3, marks=needs_fork)])
+def test_stop_on_error(spell, io_manager, workers):
+    io_manager.workers = workers
+
+    results = io_manager.process_files(spell)
+
+    assert [result.status for result in results] == [PROCESSED] * 3 + [FAILED]
+    assert results[-1].error == "boom"
+
+
+@pytest.mark.parametrize("workers", [1, pytest.param(3, marks=needs_fork)])
+def test_cancel(spell, io_manager, workers):
+    io_manager.workers = workers
+    control = BatchControl()
+
+    results = io_manager.process_files(spell, control=control, callback=lambda result: control.cancel())
+
+    assert len(results) == 1
+    assert control.is_cancelled
+    if workers == 1:
+        assert os.listdir(io_manager.output_dir) == ["00.nif"]
+
+
+def test_run_serial_passes_settled_results(spell, io_manager):
+    resolved_spell, spell_function = io_manager.prepare_run(spell)
+    file_paths = list(io_manager.iter_input_files())
+    filtered = FileResult(file_paths[1], status=FILTERED)
+
+    results = list(run_serial(io_manager, spell_function, [file_paths[0], filtered, file_paths[2]]))
+
+    assert [result.input_path for result in results] == [file_paths[0], file_paths[1], file_paths[2]]
+    assert results[1] is filtered
+    assert [result.status for result in results] == [PROCESSED, FILTERED, PROCESSED]
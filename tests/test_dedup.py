@@ -0,0 +1,122 @@
+import os
+
+import pytest
+
+from pynichon.io.batch import FAILED, PROCESSED, UNCHANGED, FileResult
+from pynichon.io.dedup import Deduplicator
+
+
+@pytest.fixture
+def inputs(tmp_path):
+    contents = {"a.nif": b"mesh 1", "b.nif": b"mesh 2", "c.nif": b"mesh 1", "d.nif": b"other mesh", "e.nif": b"mesh 1"}
+    paths = []
+    for name, data in contents.items():
+        (tmp_path / name).write_bytes(data)
+        paths.append(str(tmp_path / name))
+    return paths
+
+
+def test_filter(inputs):
+    deduplicator = Deduplicator()
+
+    items = list(deduplicator.filter(inputs))
+
+    a, b, c, d, e = inputs
+    assert items[:2] == [a, b] and items[3] == d
+    assert [item.duplicate_of for item in (items[2], items[4])] == [a, a]
+    assert deduplicator.bytes_skipped == 12
+    # Only the files sharing their size are hashed, once each.
+    assert deduplicator.hashed == 4
+
+
+def test_filter_passes_settled_results(inputs):
+    settled = FileResult(inputs[0], status=UNCHANGED)
+
+    items = list(Deduplicator().filter([settled, inputs[2]]))
+
+    assert items == [settled, inputs[2]]
+
+
+def test_filter_missing_file(inputs, tmp_path):
+    missing = str(tmp_path / "missing.nif")
+
+    assert list(Deduplicator().filter([missing])) == [missing]
+
+
+def processed(deduplicator, items, tmp_path):
+    """Write the outputs of the originals, and return the duplicates."""
+    duplicates = []
+    for item in items:
+        if isinstance(item, FileResult):
+            duplicates.append(item)
+            continue
+        output_path = str(tmp_path / "output" / os.path.basename(item))
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        with open(item, "rb") as f, open(output_path, "wb") as output:
+            output.write(f.read().upper())
+        deduplicator.record(FileResult(item, output_path))
+    return duplicates
+
+
+@pytest.mark.parametrize("mode", ["link", "copy"])
+def test_resolve(inputs, tmp_path, mode):
+    deduplicator = Deduplicator(mode)
+    duplicates = processed(deduplicator, deduplicator.filter(inputs), tmp_path)
+    output_path = str(tmp_path / "output" / "c.nif")
+
+    resolved = deduplicator.resolve(duplicates[0], output_path)
+
+    assert resolved.status == PROCESSED
+    assert resolved.output_path == output_path
+    assert resolved.duplicate_of == inputs[0]
+    with open(output_path, "rb") as f:
+        assert f.read() == b"MESH 1"
+    original_output = str(tmp_path / "output" / "a.nif")
+    assert os.path.samefile(output_path, original_output) == (mode == "link")
+    assert deduplicator.duplicates == 1
+
+
+def test_resolve_in_place_copies(inputs, tmp_path):
+    deduplicator = Deduplicator("link")
+    duplicates = processed(deduplicator, deduplicator.filter(inputs), tmp_path)
+
+    resolved = deduplicator.resolve(duplicates[0], inputs[2], in_place=True)
+
+    assert resolved.output_path == inputs[2]
+    assert not os.path.samefile(inputs[2], str(tmp_path / "output" / "a.nif"))
+
+
+def test_resolve_failed_original(inputs):
+    deduplicator = Deduplicator()
+    items = list(deduplicator.filter(inputs))
+    deduplicator.record(FileResult(inputs[0], status=FAILED, error="boom"))
+
+    resolved = deduplicator.resolve(items[2], "unused.nif")
+
+    assert (resolved.status, resolved.error, resolved.output_path) == (FAILED, "boom", None)
+
+
+def test_resolve_unprocessed_original(inputs):
+    deduplicator = Deduplicator()
+    items = list(deduplicator.filter(inputs))
+
+    resolved = deduplicator.resolve(items[2], "unused.nif")
+
+    assert resolved.status == FAILED
+    assert "not processed" in resolved.error
+
+
+def test_record_keeps_a_copy(inputs, tmp_path):
+    deduplicator = Deduplicator()
+    items = list(deduplicator.filter(inputs))
+    result = FileResult(inputs[0], status=UNCHANGED)
+    deduplicator.record(result)
+    # The batch changes the output path of results for reporting.
+    result.output_path = "reported.nif"
+
+    assert deduplicator.resolve(items[2], str(tmp_path / "c.nif")).output_path is None
+
+
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        Deduplicator("move")
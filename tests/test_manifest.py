@@ -0,0 +1,125 @@
+import os
+
+import pytest
+
+from pynichon.io.batch import FAILED, NOT_APPLICABLE, PROCESSED, UNCHANGED, UP_TO_DATE, FileResult
+from pynichon.io.manifest import Manifest, file_digest
+
+
+@pytest.fixture
+def files(tmp_path):
+    input_path = tmp_path / "input.nif"
+    input_path.write_bytes(b"mesh")
+    output_path = tmp_path / "output" / "input.nif"
+    output_path.parent.mkdir()
+    output_path.write_bytes(b"MESH")
+    return str(input_path), str(output_path), str(tmp_path / "manifest.jsonl")
+
+
+def test_is_current(files):
+    input_path, output_path, manifest_path = files
+    manifest = Manifest(manifest_path, "Upper")
+    assert not manifest.is_current(input_path, output_path)
+
+    manifest.update(FileResult(input_path, output_path))
+
+    assert manifest.is_current(input_path, output_path)
+    assert not manifest.is_current(input_path, output_path + ".other")
+    assert not Manifest(manifest_path, "Lower").is_current(input_path, output_path)
+
+
+def test_saved(files):
+    input_path, output_path, manifest_path = files
+    manifest = Manifest(manifest_path, "Upper")
+    manifest.update(FileResult(input_path, output_path))
+    manifest.update(FileResult(input_path, output_path))
+    manifest.save()
+
+    with open(manifest_path, encoding="utf-8") as f:
+        assert len(f.readlines()) == 1
+    assert Manifest(manifest_path, "Upper").is_current(input_path, output_path)
+
+
+def test_interrupted_run_keeps_progress(files):
+    input_path, output_path, manifest_path = files
+    manifest = Manifest(manifest_path, "Upper")
+    manifest.update(FileResult(input_path, output_path))
+
+    # Not saved, as when the run is killed.
+    assert Manifest(manifest_path, "Upper").is_current(input_path, output_path)
+    manifest.save()
+
+
+def test_changed_input(files):
+    input_path, output_path, manifest_path = files
+    manifest = Manifest(manifest_path, "Upper")
+    manifest.update(FileResult(input_path, output_path))
+
+    with open(input_path, "wb") as f:
+        f.write(b"mash")
+    assert not manifest.is_current(input_path, output_path)
+
+
+def test_touched_input(files):
+    input_path, output_path, manifest_path = files
+    manifest = Manifest(manifest_path, "Upper")
+    manifest.update(FileResult(input_path, output_path))
+
+    stat = os.stat(input_path)
+    os.utime(input_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert manifest.is_current(input_path, output_path)
+    assert manifest.entries[os.path.abspath(input_path)]["mtime"] == stat.st_mtime_ns + 10 ** 9
+
+
+def test_missing_output(files):
+    input_path, output_path, manifest_path = files
+    manifest = Manifest(manifest_path, "Upper")
+    manifest.update(FileResult(input_path, output_path))
+
+    os.remove(output_path)
+    assert not manifest.is_current(input_path, output_path)
+
+
+def test_in_place(files):
+    input_path, _, manifest_path = files
+    manifest = Manifest(manifest_path, "Upper")
+    result = FileResult(input_path, input_path)
+    result.input_hash = "hash of the input before the spell"
+
+    manifest.update(result)
+
+    assert manifest.entries[os.path.abspath(input_path)]["hash"] == file_digest(input_path)
+    assert manifest.is_current(input_path, input_path)
+
+
+@pytest.mark.parametrize("status", [UNCHANGED, NOT_APPLICABLE])
+def test_recorded_without_output(files, status):
+    input_path, _, manifest_path = files
+    manifest = Manifest(manifest_path, "Upper")
+
+    manifest.update(FileResult(input_path, status=status))
+
+    assert manifest.is_current(input_path, None)
+
+
+def test_update_statuses(files):
+    input_path, output_path, manifest_path = files
+    manifest = Manifest(manifest_path, "Upper")
+    manifest.update(FileResult(input_path, output_path))
+
+    manifest.update(FileResult(input_path, status=UP_TO_DATE))
+    assert manifest.is_current(input_path, output_path)
+
+    manifest.update(FileResult(input_path, status=FAILED, error="boom"))
+    assert not manifest.is_current(input_path, output_path)
+
+
+def test_skips_corrupt_lines(files):
+    input_path, output_path, manifest_path = files
+    manifest = Manifest(manifest_path, "Upper")
+    manifest.update(FileResult(input_path, output_path, status=PROCESSED))
+    manifest.save()
+    with open(manifest_path, "a", encoding="utf-8") as f:
+        f.write('{"input": "trunc')
+
+    assert Manifest(manifest_path, "Upper").is_current(input_path, output_path)
@@ -0,0 +1,68 @@
+import io
+import struct
+
+import pytest
+
+from benchmarks.synthetic import PROFILES, make_nif
+from pynichon.io.nif_header import HeaderIndex, read_header, version_from_string, version_to_string
+from pynichon.io.nif_io import NifError
+
+# Size of the footer of a synthetic NIF: the root count and one root.
+FOOTER_SIZE = 8
+
+
+@pytest.mark.parametrize("profile", sorted(PROFILES))
+def test_read_header(profile):
+    version, user_version, bs_version = PROFILES[profile]
+    data = make_nif("small", profile)
+
+    header = read_header(io.BytesIO(data))
+
+    assert header.version == version_from_string(version)
+    assert header.user_version == user_version
+    assert header.bs_version == bs_version
+    assert header.num_blocks == 5
+    assert header.block_type_names() == {"NiNode", "NiBinaryExtraData"}
+    if header.version >= 0x14020005:
+        assert header.data_offset + sum(header.block_sizes) + FOOTER_SIZE == len(data)
+        offset = header.block_sizes_offset
+        assert list(struct.unpack_from("<5I", data, offset)) == header.block_sizes
+    else:
+        assert header.block_sizes is None
+    if header.version >= 0x14010001:
+        assert "Scene Root" in header.strings
+
+
+@pytest.mark.parametrize("kind", ["many_blocks", "deep"])
+def test_read_header_many_blocks(kind):
+    data = make_nif(kind, "skyrim")
+
+    header = read_header(io.BytesIO(data))
+
+    assert header.num_blocks == len(header.block_sizes)
+    assert header.data_offset + sum(header.block_sizes) + FOOTER_SIZE == len(data)
+
+
+@pytest.mark.parametrize("data", [b"", b"not a nif\n", b"Gamebryo File Format" * 20, b"Version x\n"])
+def test_read_header_rejects_other_files(data):
+    with pytest.raises(NifError):
+        read_header(io.BytesIO(data))
+
+
+def test_version_strings():
+    assert version_from_string("20.2.0.7") == 0x14020007
+    assert version_to_string(0x14020007) == "20.2.0.7"
+
+
+def test_header_index(tmp_path):
+    nif_path = tmp_path / "test.nif"
+    nif_path.write_bytes(make_nif("small", "skyrim"))
+    index_path = tmp_path / "headers.jsonl"
+
+    index = HeaderIndex(str(index_path))
+    header = index.get(str(nif_path))
+    index.save()
+
+    cached = HeaderIndex(str(index_path)).get(str(nif_path))
+    assert cached.to_dict() == header.to_dict()
+    assert cached.strings is None
@@ -0,0 +1,127 @@
+import io
+import mmap
+
+import pytest
+
+from benchmarks.synthetic import make_nif
+from pynichon.io.nif_header import read_header
+from pynichon.io.nif_splice import splice_nif
+
+
+class NiObject:
+    """A block that serializes to the bytes it holds, like a nifgen block would."""
+
+    def __init__(self, data):
+        self.data = data
+
+    @classmethod
+    def to_stream(cls, instance, stream, context):
+        stream.write(instance.data)
+
+
+class NiNode(NiObject):
+    pass
+
+
+class NiBinaryExtraData(NiObject):
+    pass
+
+
+class BrokenData(NiBinaryExtraData):
+
+    @classmethod
+    def to_stream(cls, instance, stream, context):
+        raise ValueError("cannot serialize")
+
+
+class FakeNif:
+
+    def __init__(self, blocks):
+        self.blocks = blocks
+
+
+def parse(data):
+    """Split a synthetic NIF into blocks of the types its header lists."""
+    header = read_header(io.BytesIO(data))
+    types = {"NiNode": NiNode, "NiBinaryExtraData": NiBinaryExtraData}
+    blocks = []
+    offset = header.data_offset
+    for type_index, size in zip(header.block_type_index, header.block_sizes):
+        blocks.append(types[header.block_types[type_index]](data[offset:offset + size]))
+        offset += size
+    return FakeNif(blocks)
+
+
+def test_splice_unmodified():
+    data = make_nif("small", "skyrim")
+
+    spliced = splice_nif(parse(data), data, {"NiNode", "NiBinaryExtraData"})
+
+    assert spliced.modified_blocks == 0
+    assert len(spliced) == len(data)
+    assert spliced.to_bytes() == data
+
+
+def test_splice_modified_block():
+    data = make_nif("small", "skyrim")
+    nif_data = parse(data)
+    extra_data = nif_data.blocks[-1]
+    extra_data.data += b"\0" * 16
+
+    spliced = splice_nif(nif_data, data, {"NiBinaryExtraData"})
+    output = spliced.to_bytes()
+
+    assert spliced.modified_blocks == 1
+    assert len(spliced) == len(output) == len(data) + 16
+    header = read_header(io.BytesIO(output))
+    assert header.block_sizes[-1] == len(extra_data.data)
+    assert header.block_sizes[:-1] == read_header(io.BytesIO(data)).block_sizes[:-1]
+    end = header.data_offset + sum(header.block_sizes)
+    assert output[end - len(extra_data.data):end] == extra_data.data
+    assert output[:header.block_sizes_offset] == data[:header.block_sizes_offset]
+    assert output[end:] == data[-(len(output) - end):]
+
+
+def test_splice_only_given_types():
+    data = make_nif("small", "skyrim")
+    nif_data = parse(data)
+    nif_data.blocks[-1].data += b"\0"
+
+    spliced = splice_nif(nif_data, data, {"NiNode"})
+
+    assert spliced.to_bytes() == data
+
+
+def test_splice_mmap(tmp_path):
+    data = make_nif("many_blocks", "skyrim")
+    nif_data = parse(data)
+    nif_data.blocks[0].data = nif_data.blocks[0].data[:-4]
+    expected = splice_nif(nif_data, data, {"NiNode"}).to_bytes()
+    nif_path = tmp_path / "test.nif"
+    nif_path.write_bytes(data)
+
+    with open(nif_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        spliced = splice_nif(nif_data, mapped, {"NiNode"})
+        assert b"".join(spliced.chunks()) == expected
+        assert len(spliced) == len(expected) == len(data) - 4
+
+
+@pytest.mark.parametrize("data", [make_nif("small", "oblivion"), b"FAKENIF\n"], ids=["oblivion", "other"])
+def test_splice_without_block_sizes(data):
+    assert splice_nif(FakeNif([NiNode(b"")] * 5), data, {"NiNode"}) is None
+
+
+def test_splice_block_count_mismatch():
+    data = make_nif("small", "skyrim")
+    nif_data = parse(data)
+    del nif_data.blocks[-1]
+
+    assert splice_nif(nif_data, data, {"NiNode"}) is None
+
+
+def test_splice_serialization_error():
+    data = make_nif("small", "skyrim")
+    nif_data = parse(data)
+    nif_data.blocks[-1] = BrokenData(nif_data.blocks[-1].data)
+
+    assert splice_nif(nif_data, data, {"NiBinaryExtraData"}) is None
@@ -0,0 +1,94 @@
+import pickle
+
+import pytest
+
+from pynichon.utils.spell_options import FALSE_STRINGS, TRUE_STRINGS, OptionsModel, OptionsSnapshot, parse_bool
+
+OPTIONS = [
+    {"Type": "Paragraph", "Text": "Settings"},
+    {"Name": "Enabled", "Type": "Checkbox", "Label": "Enabled", "Default": True},
+    {"Name": "Count", "Type": "Textbox", "Value Type": "Integer", "Default": "3"},
+    {"Name": "Scale", "Type": "Textbox", "Value Type": "Float", "Default": ""},
+    {"Name": "Mode", "Type": "Dropdown", "Options": ["Fast", "Exact"], "Default": ""},
+    {"Name": "Rename", "Type": "Table", "Columns": [{"Label": "From", "Widget": "Textbox"},
+                                                    {"Label": "To", "Widget": "Textbox"},
+                                                    {"Label": "Regex", "Widget": "Checkbox"}]},
+]
+
+
+@pytest.mark.parametrize("text", sorted(TRUE_STRINGS))
+def test_parse_bool_true(text):
+    assert parse_bool(text) is True
+    assert parse_bool(f" {text.upper()} ") is True
+
+
+@pytest.mark.parametrize("text", sorted(FALSE_STRINGS))
+def test_parse_bool_false(text):
+    assert parse_bool(text) is False
+
+
+def test_parse_bool_invalid():
+    with pytest.raises(ValueError):
+        parse_bool("maybe")
+
+
+def test_defaults():
+    snapshot = OptionsModel(OPTIONS).snapshot()
+
+    assert dict(snapshot) == {"Enabled": True, "Count": 3, "Scale": None, "Mode": "Fast", "Rename": ()}
+
+
+def test_values():
+    snapshot = OptionsModel(OPTIONS).snapshot(
+        {"Enabled": "no", "Count": "7", "Scale": "0.5", "Mode": "Exact", "Rename": "a, b, yes; ;c,d"})
+
+    assert snapshot["Enabled"] is False
+    assert snapshot["Count"] == 7
+    assert snapshot["Scale"] == 0.5
+    assert snapshot["Mode"] == "Exact"
+    assert snapshot["Rename"] == (("a", "b", True), ("c", "d", False))
+
+
+def test_table_widget_rows():
+    snapshot = OptionsModel(OPTIONS).snapshot({"Rename": [["a", "b", True], [" c "]]})
+
+    assert snapshot["Rename"] == (("a", "b", True), ("c", "", False))
+
+
+@pytest.mark.parametrize("values", [{"Count": "x"}, {"Mode": "Slow"}, {"Enabled": "maybe"}])
+def test_invalid_value(values):
+    with pytest.raises(ValueError, match="Invalid value for option"):
+        OptionsModel(OPTIONS).snapshot(values)
+
+
+def test_unknown_option():
+    with pytest.raises(ValueError, match="Unknown option 'Colour'. Options are: Enabled, Count"):
+        OptionsModel(OPTIONS).snapshot({"Colour": "red"})
+
+
+def test_merge():
+    model = OptionsModel([{"Name": "Count", "Type": "Textbox", "Default": "1", "Style": {"Row": 1}}])
+    model.merge(OptionsModel(OPTIONS))
+
+    assert model.snapshot()["Count"] == "1"
+    assert list(model.specs) == ["Count", "Enabled", "Scale", "Mode", "Rename"]
+    assert [option.get("Style", {}).get("Row") for option in model.options] == [1, 2, 2, 2, 2, 2]
+
+
+def test_snapshot_pickle():
+    snapshot = OptionsModel(OPTIONS).snapshot({"Rename": "a,b"})
+
+    copy = pickle.loads(pickle.dumps(snapshot))
+
+    assert copy == snapshot
+    assert hash(copy) == hash(snapshot)
+    assert copy["Rename"] == (("a", "b", False),)
+
+
+def test_snapshot_key():
+    snapshot = OptionsModel(OPTIONS).snapshot({"Rename": "a,b"})
+    reordered = OptionsSnapshot(dict(reversed(list(snapshot.items()))))
+
+    assert reordered.key() == snapshot.key()
+    assert list(snapshot.key()) == sorted(snapshot)
+    assert snapshot.key()["Rename"] == [["a", "b", False]]